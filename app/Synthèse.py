@@ -3,7 +3,7 @@ import pandas as pd
 import sys, os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from db import engine
+from app.donnees import agregats_mensuels, avertir_hors_ligne, soldes
 
 st.set_page_config(
     page_title="Budget App",
@@ -13,14 +13,14 @@ st.set_page_config(
 )
 
 st.title("📊 Dashboard — Synthèse")
+avertir_hors_ligne()
 
-df = pd.read_sql("SELECT * FROM operations", engine)
-
-# S'assurer que Date est bien un datetime
-df["Date"] = pd.to_datetime(df["Date"])
+# Soldes des opérations + agrégats mensuels (vue matérialisée), en cache
+df_soldes = soldes()
+agregats = agregats_mensuels()
 
 # Trier par compte + date
-df_sorted = df.sort_values(["Compte", "Date"])
+df_sorted = df_soldes.sort_values(["Compte", "Date"])
 
 # Prendre la dernière valeur pour chaque compte
 solde_par_compte = (
@@ -33,13 +33,11 @@ solde_par_compte = (
 solde_total = float(solde_par_compte["Solde courant"].sum())
 
 
-depenses = float(df["Débit euros"].sum())
-revenus = float(df["Crédit euros"].sum())
-
-df["Mois"] = pd.to_datetime(df["Date"]).dt.to_period("M")
+depenses = float(agregats["Débit euros"].sum())
+revenus = float(agregats["Crédit euros"].sum())
 
-depenses_par_mois = df[df["Compte"] == 1].groupby("Mois")["Débit euros"].sum()
-revenus_par_mois  = df[df["Compte"] == 1].groupby("Mois")["Crédit euros"].sum()
+depenses_par_mois = agregats[agregats["Compte"] == 1].groupby("Mois")["Débit euros"].sum()
+revenus_par_mois  = agregats[agregats["Compte"] == 1].groupby("Mois")["Crédit euros"].sum()
 
 depenses_mensuelles_moyennes = float(depenses_par_mois.mean())
 revenus_mensuels_moyens = float(revenus_par_mois.mean())
@@ -75,10 +73,7 @@ for compte_id in [1, 2]:  # ordre d'affichage souhaité
 st.subheader("📈 Évolution du solde — Compte courant")
 
 # Filtrer uniquement le compte 1
-df_compte1 = df[df["Compte"] == 1].copy()
-
-# S'assurer que la date est bien un datetime
-df_compte1["Date"] = pd.to_datetime(df_compte1["Date"])
+df_compte1 = df_soldes[df_soldes["Compte"] == 1].copy()
 
 # Trier par date (au cas où)
 df_compte1 = df_compte1.sort_values("Date")
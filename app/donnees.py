@@ -0,0 +1,379 @@
+# ======================================================
+# 🗄️ Accès aux données partagé par les pages Streamlit
+# ======================================================
+# Les lectures sont mises en cache (st.cache_data) avec comme clé le
+# compteur de version de la table (table_versions), incrémenté à chaque
+# écriture (Upload, formulaire de catégorisation, scripts).
+# Tant que la version ne change pas, les pages ne relisent pas la base.
+#
+# Les lectures passent par l'engine "lecture" (réplica ou pool dédié en
+# lecture seule, délai maximal par requête), les écritures par "ecriture".
+#
+# Snapshot Parquet (scripts/snapshot.py) :
+# - s'il est à la version courante, les opérations et les soldes y sont
+#   lus au lieu de PostgreSQL (démarrage à froid)
+# - si la base est injoignable, toutes les lectures passent dessus et les
+#   pages sont en lecture seule (hors_ligne())
+# ======================================================
+
+import os
+
+import pandas as pd
+import streamlit as st
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+import db
+from scripts.agregats import (
+    CONDITION_VIREMENT_INTERNE,
+    VUES,
+    agreger,
+    masque_virements_internes,
+    rafraichir_agregats,
+)
+from scripts.cache_categories import memoriser_operations
+from scripts.schema import CONDITION_A_TRAITER, appliquer_migrations
+from scripts.snapshot import CHEMIN_SNAPSHOT, lire_snapshot, version_snapshot
+
+# Durée (s) pendant laquelle le jeton de fraîcheur est réutilisé sans
+# interroger la base. Les écritures faites depuis l'app l'invalident aussitôt.
+DUREE_JETON = 30
+
+
+@st.cache_resource
+def get_engine():
+    # Schéma mis à jour une fois par processus, au premier accès
+    engine = db.get_engine()
+    with engine.begin() as conn:
+        appliquer_migrations(conn)
+    return engine
+
+
+def engine_lecture():
+    get_engine()
+    return db.get_engine("lecture")
+
+
+@st.cache_data(ttl=DUREE_JETON, show_spinner=False)
+def version_operations() -> int | None:
+    """Version courante de operations, None si la base est injoignable."""
+    try:
+        with engine_lecture().connect() as conn:
+            return db.lire_version(conn)
+    except OperationalError:
+        return None
+
+
+def invalider() -> None:
+    """À appeler après une écriture depuis l'app : le jeton est relu au prochain rerun."""
+    version_operations.clear()
+
+
+def hors_ligne() -> bool:
+    """Base injoignable : les pages lisent le snapshot et n'écrivent rien."""
+    return version_operations() is None
+
+
+def avertir_hors_ligne() -> None:
+    """Bandeau des pages en mode hors ligne (arrêt de la page s'il n'y a pas de snapshot)."""
+    if not hors_ligne():
+        return
+    if not os.path.exists(CHEMIN_SNAPSHOT):
+        st.error("❌ Base de données injoignable et aucun snapshot local disponible.")
+        st.stop()
+    st.warning("📴 Base de données injoignable : affichage du dernier snapshot, en lecture seule.")
+
+
+def _jeton() -> tuple:
+    """Clé de cache des lectures : version de la base et date du snapshot."""
+    jeton_snapshot = os.path.getmtime(CHEMIN_SNAPSHOT) if os.path.exists(CHEMIN_SNAPSHOT) else None
+    return version_operations(), jeton_snapshot
+
+
+def _depuis_snapshot(version: int | None) -> bool:
+    return version is None or version == version_snapshot()
+
+
+@st.cache_data(max_entries=2, show_spinner="Chargement des opérations...")
+def _operations(version: int | None, jeton_snapshot) -> pd.DataFrame:
+    if _depuis_snapshot(version):
+        df = lire_snapshot()
+    else:
+        df = pd.read_sql("SELECT * FROM operations", engine_lecture())
+    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+    df["Mois"] = df["Date"].dt.to_period("M")
+    return df
+
+
+def charger_operations() -> pd.DataFrame:
+    """Table operations complète, dates converties et colonne Mois ajoutée."""
+    return _operations(*_jeton())
+
+
+# -----------------------------
+# Agrégats mensuels (vues matérialisées)
+# -----------------------------
+@st.cache_data(max_entries=4, show_spinner=False)
+def _agregats(version: int | None, jeton_snapshot, vue: str) -> pd.DataFrame:
+    if vue not in VUES:
+        raise ValueError(f"❌ Vue inconnue : {vue}")
+    if version is None:
+        df = agreger(lire_snapshot(), vue)
+    else:
+        df = pd.read_sql(text(f"SELECT * FROM {vue}"), engine_lecture())
+    df["Mois"] = pd.to_datetime(df["Mois"]).dt.to_period("M")
+    return df
+
+
+def agregats_mensuels() -> pd.DataFrame:
+    """Débits / crédits / effectifs par (Mois, Compte, Categorie)."""
+    return _agregats(*_jeton(), "operations_mensuelles")
+
+
+def revenus_mensuels() -> pd.DataFrame:
+    """Épargne (virements internes) et salaires par (Mois, Compte)."""
+    return _agregats(*_jeton(), "revenus_mensuels")
+
+
+# -----------------------------
+# Lectures ciblées (colonnes utiles uniquement)
+# -----------------------------
+@st.cache_data(max_entries=2, show_spinner=False)
+def _soldes(version: int | None, jeton_snapshot) -> pd.DataFrame:
+    colonnes = ["Date", "Compte", "Solde courant"]
+    if _depuis_snapshot(version):
+        df = lire_snapshot(colonnes)
+    else:
+        df = pd.read_sql('SELECT "Date", "Compte", "Solde courant" FROM operations', engine_lecture())
+    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+    return df
+
+
+def soldes() -> pd.DataFrame:
+    """Solde courant de chaque opération : (Date, Compte, Solde courant)."""
+    return _soldes(*_jeton())
+
+
+COLONNES_FILTREES = ["Date", "Compte", "Libellé", "Débit euros", "Crédit euros"]
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _operations_filtrees(version: int | None, jeton_snapshot, filtre: str, mot: str = "") -> pd.DataFrame:
+    if version is None:
+        df = lire_snapshot(COLONNES_FILTREES)
+        if filtre == "virements_internes":
+            df = df[masque_virements_internes(df["Libellé"])]
+        else:
+            df = df[df["Libellé"].fillna("").str.upper().str.contains(mot.upper(), regex=False)]
+        df = df.reset_index(drop=True)
+    else:
+        if filtre == "virements_internes":
+            condition, params = CONDITION_VIREMENT_INTERNE, {}
+        else:
+            condition, params = 'UPPER("Libellé") LIKE :motif', {"motif": f"%{mot.upper()}%"}
+        df = pd.read_sql(
+            text(f"""
+                SELECT "Date", "Compte", "Libellé", "Débit euros", "Crédit euros"
+                FROM operations
+                WHERE {condition}
+            """),
+            engine_lecture(),
+            params=params,
+        )
+    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+    return df
+
+
+def virements_internes() -> pd.DataFrame:
+    """Virements entre comptes personnels (même règle que revenus_mensuels)."""
+    return _operations_filtrees(*_jeton(), "virements_internes")
+
+
+def operations_contenant(mot: str) -> pd.DataFrame:
+    """Opérations dont le libellé contient `mot` (sans tenir compte de la casse)."""
+    return _operations_filtrees(*_jeton(), "contenant", mot)
+
+
+# -----------------------------
+# Dépenses sur une période (bornes poussées dans le WHERE)
+# -----------------------------
+@st.cache_data(max_entries=2, show_spinner=False)
+def _bornes_dates(version: int | None, jeton_snapshot) -> tuple:
+    if _depuis_snapshot(version):
+        dates = pd.to_datetime(lire_snapshot(["Date"])["Date"], errors="coerce")
+        return dates.min().date(), dates.max().date()
+    with engine_lecture().connect() as conn:
+        return tuple(conn.execute(text('SELECT MIN("Date"), MAX("Date") FROM operations')).one())
+
+
+def bornes_dates() -> tuple:
+    """Dates de la première et de la dernière opération (parcours de l'index sur Date)."""
+    return _bornes_dates(*_jeton())
+
+
+COLONNES_PERIODE = ["Date", "Compte", "Categorie", "Débit euros", "Crédit euros"]
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _depenses_mensuelles(version: int | None, jeton_snapshot, debut, fin) -> pd.DataFrame:
+    if version is None:
+        df = lire_snapshot(COLONNES_PERIODE)
+        df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+        df = df[df["Date"] >= pd.Timestamp(debut)]
+        if fin is not None:
+            df = df[df["Date"] <= pd.Timestamp(fin)]
+        df = agreger(df, "operations_mensuelles")
+        df = df.groupby(["Mois", "Categorie"], as_index=False)[["Débit euros", "nb_debits"]].sum()
+    elif fin is None:
+        # Mois entiers jusqu'au dernier : lus dans la vue matérialisée (index sur Mois)
+        df = pd.read_sql(
+            text("""
+                SELECT "Mois", "Categorie", SUM("Débit euros") AS "Débit euros", SUM(nb_debits) AS nb_debits
+                FROM operations_mensuelles
+                WHERE "Mois" >= :debut
+                GROUP BY 1, 2
+            """),
+            engine_lecture(),
+            params={"debut": debut},
+        )
+    else:
+        # Bornes au jour près : agrégées depuis operations (index couvrant sur Date)
+        df = pd.read_sql(
+            text("""
+                SELECT CAST(date_trunc('month', "Date") AS DATE) AS "Mois", "Categorie",
+                       SUM("Débit euros") AS "Débit euros",
+                       COUNT(*) FILTER (WHERE "Débit euros" > 0) AS nb_debits
+                FROM operations
+                WHERE "Date" >= :debut AND "Date" <= :fin
+                GROUP BY 1, 2
+            """),
+            engine_lecture(),
+            params={"debut": debut, "fin": fin},
+        )
+    df["Mois"] = pd.to_datetime(df["Mois"]).dt.to_period("M")
+    return df
+
+
+def depenses_mensuelles(debut, fin=None) -> pd.DataFrame:
+    """
+    Débits et nombre de débits par (Mois, Categorie) depuis `debut` (date),
+    jusqu'à `fin` incluse si fournie, sinon jusqu'à la dernière opération.
+    """
+    return _depenses_mensuelles(*_jeton(), debut, fin)
+
+
+COLONNES_TOP = ["Date", "Libellé", "Categorie", "Débit euros"]
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _top_depenses(version: int | None, jeton_snapshot, debut, fin, categorie: str | None, n: int) -> pd.DataFrame:
+    if version is None:
+        df = lire_snapshot(COLONNES_TOP)
+        df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+        df = df[df["Débit euros"].notna() & (df["Date"] >= pd.Timestamp(debut))]
+        if fin is not None:
+            df = df[df["Date"] <= pd.Timestamp(fin)]
+        if categorie is not None:
+            df = df[df["Categorie"] == categorie]
+        return df.sort_values("Débit euros", ascending=False).head(n).reset_index(drop=True)
+
+    condition, params = '"Débit euros" IS NOT NULL AND "Date" >= :debut', {"debut": debut, "n": n}
+    if fin is not None:
+        condition += ' AND "Date" <= :fin'
+        params["fin"] = fin
+    if categorie is not None:
+        condition += ' AND "Categorie" = :categorie'
+        params["categorie"] = categorie
+    # Index (Categorie, Débit euros DESC) ou (Débit euros DESC) : lecture
+    # des n premières entrées de l'index dans la période, sans tri
+    df = pd.read_sql(
+        text(f"""
+            SELECT "Date", "Libellé", "Categorie", "Débit euros"
+            FROM operations
+            WHERE {condition}
+            ORDER BY "Débit euros" DESC
+            LIMIT :n
+        """),
+        engine_lecture(),
+        params=params,
+    )
+    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+    return df
+
+
+def top_depenses(debut, categorie: str | None = None, n: int = 20, fin=None) -> pd.DataFrame:
+    """Les `n` plus grosses dépenses entre `debut` et `fin` (dates, `fin` facultative), d'une catégorie ou de toutes."""
+    return _top_depenses(*_jeton(), debut, fin, categorie, n)
+
+
+# -----------------------------
+# File des opérations à catégoriser
+# -----------------------------
+# Pagination par clé sur (Date, id), servie par l'index partiel
+# ix_operations_a_traiter : une page coûte la même chose quelle que soit
+# la longueur de la file (pas d'OFFSET, pas de relecture de la table).
+@st.cache_data(max_entries=2, show_spinner=False)
+def _nb_a_traiter(version: int | None, jeton_snapshot) -> int:
+    with engine_lecture().connect() as conn:
+        return conn.execute(text(f"SELECT COUNT(*) FROM operations WHERE {CONDITION_A_TRAITER}")).scalar()
+
+
+def nb_a_traiter() -> int:
+    """Nombre d'opérations à catégoriser (comptage sur l'index partiel)."""
+    return _nb_a_traiter(*_jeton())
+
+
+def lire_a_traiter(apres: tuple | None, limite: int) -> pd.DataFrame:
+    """
+    Au plus `limite` opérations à catégoriser (id, Date, Libellé, Débit
+    euros), dans l'ordre (Date, id), situées après la clé `apres` = (Date, id)
+    ou depuis le début de la file si `apres` vaut None. Non mis en cache :
+    la page garde elle-même les lignes déjà lues.
+    """
+    condition, params = CONDITION_A_TRAITER, {"limite": limite}
+    if apres is not None:
+        condition += ' AND ("Date", id) > (:date, :id)'
+        params.update(date=pd.Timestamp(apres[0]).date(), id=int(apres[1]))
+    df = pd.read_sql(
+        text(f"""
+            SELECT id, "Date", "Libellé", "Débit euros"
+            FROM operations
+            WHERE {condition}
+            ORDER BY "Date", id
+            LIMIT :limite
+        """),
+        engine_lecture(),
+        params=params,
+    )
+    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+    return df
+
+
+# -----------------------------
+# Écritures depuis l'app
+# -----------------------------
+def enregistrer_categories(choix: dict) -> int:
+    """
+    Enregistre les catégories choisies dans le formulaire ({id: catégorie})
+    en une seule requête (tableaux id / catégorie dépliés par unnest), puis
+    rafraîchit les agrégats et invalide les caches. Choisir "Autres" marque
+    seulement l'opération comme traitée. Les autres choix sont aussi mémorisés
+    dans le cache libellé → catégorie. Renvoie le nombre de lignes modifiées.
+    """
+    if not choix:
+        return 0
+
+    with get_engine().begin() as conn:
+        resultat = conn.execute(text("""
+            UPDATE operations o
+            SET "Categorie" = CASE WHEN v.categorie = 'Autres' THEN o."Categorie" ELSE v.categorie END,
+                "Traitee" = TRUE
+            FROM unnest(CAST(:ids AS BIGINT[]), CAST(:categories AS TEXT[])) AS v(id, categorie)
+            WHERE o.id = v.id
+        """), {"ids": [int(i) for i in choix], "categories": list(choix.values())})
+        memoriser_operations(conn, choix)
+        rafraichir_agregats(conn)
+        db.incrementer_version(conn)
+
+    invalider()
+    return resultat.rowcount
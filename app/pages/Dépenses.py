@@ -4,16 +4,29 @@ import pandas as pd
 import sys, os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from db import engine
+from app.donnees import (
+    avertir_hors_ligne,
+    bornes_dates,
+    depenses_mensuelles,
+    enregistrer_categories,
+    hors_ligne,
+    lire_a_traiter,
+    nb_a_traiter,
+    top_depenses,
+)
+
+# Périodes proposées pour l'analyse des dépenses (nombre de mois)
+PERIODES = {"3 mois": 3, "6 mois": 6, "12 mois": 12, "24 mois": 24}
+
+# Nombre d'opérations proposées par page du formulaire de catégorisation
+TAILLES_PAGE = [3, 10, 25, 50, 100]
 
 st.session_state.sidebar_closed = True
 st.set_page_config(initial_sidebar_state="collapsed", layout="wide")
 
 
-# Connexion DB
-df = pd.read_sql("SELECT * FROM operations", engine)
-
 st.title("📊 Suivi de budget")
+avertir_hors_ligne()
 
 # Charger depuis SQLite
 
@@ -24,21 +37,43 @@ import pandas as pd
 
 
 # ========================================
-# 🔥 FILTRE DE PERIODE FIXE : 6 DERNIERS MOIS
+# 🔥 FILTRE DE PERIODE
 # ========================================
 
-st.subheader("📊 Analyse des dépenses (6 derniers mois)")
+premiere_date, derniere_date = bornes_dates()
+dernier_mois = pd.Period(derniere_date, freq="M")
 
-# Convertir la date
-df["Date"] = pd.to_datetime(df["Date"])
-df["Mois"] = df["Date"].dt.to_period("M")
+choix_periode = st.radio("Période", list(PERIODES) + ["Personnalisée"], index=1, horizontal=True)
 
-# Dépenses uniquement
-df_dep = df[df["Débit euros"].notna()].copy()
+if choix_periode == "Personnalisée":
+    plage = st.date_input(
+        "Du … au",
+        # Six derniers mois par défaut, sans remonter avant la première opération
+        value=(max((dernier_mois - 5).start_time.date(), premiere_date), derniere_date),
+        min_value=premiere_date,
+        max_value=derniere_date,
+        format="DD/MM/YYYY",
+    )
+    if len(plage) < 2:
+        st.info("Choisissez la date de fin de la période.")
+        st.stop()
+    debut_periode, fin_periode = plage
+    libelle_periode = f"du {debut_periode:%d/%m/%Y} au {fin_periode:%d/%m/%Y}"
+else:
+    # Mois entiers : du premier jour du (n - 1)e mois avant le dernier mois connu
+    debut_periode = (dernier_mois - (PERIODES[choix_periode] - 1)).start_time.date()
+    fin_periode = None
+    libelle_periode = f"{PERIODES[choix_periode]} derniers mois"
 
-# Appliquer le filtre : 6 derniers mois
-dernier_mois = df_dep["Mois"].max()
-df_dep = df_dep[df_dep["Mois"] >= dernier_mois - 5]
+st.subheader(f"📊 Analyse des dépenses ({libelle_periode})")
+
+# Débits par (Mois, Categorie) de la période seulement (bornes dans le WHERE)
+df_dep_mois = depenses_mensuelles(debut_periode, fin_periode)
+df_dep_mois = df_dep_mois[df_dep_mois["nb_debits"] > 0]
+
+if df_dep_mois.empty:
+    st.info("Aucune dépense sur cette période.")
+    st.stop()
 
 
 # ========================================
@@ -51,7 +86,7 @@ with col1:
     st.subheader("📈 Part des dépenses dans le temps (%)")
 
     df_trend = (
-        df_dep.groupby(["Mois", "Categorie"])["Débit euros"]
+        df_dep_mois.groupby(["Mois", "Categorie"])["Débit euros"]
         .sum()
         .reset_index()
         .rename(columns={"Débit euros": "Debit"})
@@ -87,7 +122,7 @@ with col2:
     st.subheader("🥧 Répartition par catégorie")
 
     df_pie = (
-        df_dep.groupby("Categorie")["Débit euros"]
+        df_dep_mois.groupby("Categorie")["Débit euros"]
         .sum()
         .reset_index()
         .rename(columns={"Débit euros": "Montant"})
@@ -114,23 +149,23 @@ with col2:
     st.altair_chart(chart_pie, use_container_width=True)
 
 # ========================================
-# 📊 COMPARAISON MOIS COURANT VS MOYENNE 6 MOIS
+# 📊 COMPARAISON MOIS COURANT VS MOYENNE DE LA PERIODE
 # ========================================
 
-mois_courant = df_dep["Mois"].max()
+mois_courant = df_dep_mois["Mois"].max()
 
 # Dépenses du mois courant
 df_current = (
-    df_dep[df_dep["Mois"] == mois_courant]
+    df_dep_mois[df_dep_mois["Mois"] == mois_courant]
     .groupby("Categorie")["Débit euros"]
     .sum()
     .reset_index()
     .rename(columns={"Débit euros": "Montant"})
 )
 
-# Moyenne mensuelle sur 6 mois
+# Moyenne mensuelle sur la période
 df_avg = (
-    df_dep.groupby(["Mois", "Categorie"])["Débit euros"]
+    df_dep_mois.groupby(["Mois", "Categorie"])["Débit euros"]
     .sum()
     .reset_index()
     .groupby("Categorie")["Débit euros"]
@@ -141,7 +176,7 @@ df_avg = (
 
 # Ajouter un label pour le graphique
 df_current["Type"] = "Mois courant"
-df_avg["Type"] = "Moyenne 6 mois"
+df_avg["Type"] = "Moyenne de la période"
 
 # Combiner
 # Pivot to compute deviation
@@ -156,7 +191,7 @@ df_pivot = (
     .reset_index()
 )
 
-df_pivot["Écart (€)"] = df_pivot["Mois courant"] - df_pivot["Moyenne 6 mois"]
+df_pivot["Écart (€)"] = df_pivot["Mois courant"] - df_pivot["Moyenne de la période"]
 
 
 
@@ -187,15 +222,19 @@ st.altair_chart(chart_dev, use_container_width=True)
 
 
 # Filtre catégories pour ce tableau
-st.subheader("Top 20 dépenses les plus importantes (6 derniers mois)")
+st.subheader(f"Top 20 dépenses les plus importantes ({libelle_periode})")
 
-# ✅ Liste unique des catégories (triées)
-categories = sorted(df["Categorie"].dropna().unique())
+# ✅ Liste unique des catégories de la période (triées)
+categories = sorted(df_dep_mois["Categorie"].dropna().unique())
 
 # ✅ Initialisation (catégorie active ou aucune)
 if "active_category" not in st.session_state:
     st.session_state.active_category = None
 
+# Catégorie absente de la nouvelle période : filtre retiré
+if st.session_state.active_category not in categories:
+    st.session_state.active_category = None
+
 
 st.write("Filtrer par catégorie :")
 
@@ -222,44 +261,54 @@ for i, cat in enumerate(categories):
             st.session_state.active_category = cat
 
 
-# ✅ Filtrage
-dernier_mois = df_dep["Mois"].max()
-six_mois = dernier_mois - 5
-df_6m = df_dep[df_dep["Mois"] >= six_mois]
-
-df_top = df_6m.copy()
-
-if st.session_state.active_category:
-    df_top = df_top[df_top["Categorie"] == st.session_state.active_category]
-
-df_top = (
-    df_top.sort_values("Débit euros", ascending=False)
-          .head(20)
-          [["Date", "Libellé", "Categorie", "Débit euros"]]
-)
+# ✅ Filtrage en base : n plus gros débits de la période (et de la catégorie),
+# mis en cache par (période, catégorie)
+df_top = top_depenses(debut_periode, st.session_state.active_category or None, n=20, fin=fin_periode)
 
 st.dataframe(df_top)
 
-from sqlalchemy import text
-
 st.subheader("🟡 Catégoriser les opérations non classées")
 
-df_autres = df[
-    (df["Categorie"] == "Autres")
-    & (df["Traitee"] == False)
-    & (df["Débit euros"].notna())
-].copy()
+# File lue page par page en base (pagination par clé sur (Date, id)) :
+# - file_curseur : clé de la dernière opération avant la page (None = début)
+# - file_lignes  : opérations déjà lues après le curseur (page + suivante)
+# - file_pile    : curseurs et rangs des pages précédentes
+def reinitialiser_file() -> None:
+    st.session_state.file_curseur = None
+    st.session_state.file_rang = 0
+    st.session_state.file_pile = []
+    st.session_state.file_lignes = None
+
 
+if "file_curseur" not in st.session_state:
+    reinitialiser_file()
 
-if len(df_autres) == 0:
+
+if hors_ligne():
+    st.info("📴 Catégorisation indisponible hors ligne.")
+elif nb_a_traiter() == 0:
     st.success("🎉 Aucune opération à catégoriser !")
 else:
-    page_size = 3
-    total_pages = (len(df_autres) - 1) // page_size + 1
-    page = st.number_input("Page", 1, total_pages, 1)
+    page_size = st.selectbox(
+        "Opérations par page", TAILLES_PAGE, index=TAILLES_PAGE.index(25), on_change=reinitialiser_file
+    )
+
+    # Page courante et suivante lues en une requête (LIMIT 2 × page) ; la
+    # suivante est affichée sans requête après l'enregistrement de celle-ci
+    lignes = st.session_state.file_lignes
+    if lignes is None or (len(lignes) < page_size and lignes.attrs.get("suite")):
+        lignes = lire_a_traiter(st.session_state.file_curseur, 2 * page_size)
+        lignes.attrs["suite"] = len(lignes) == 2 * page_size  # file plus longue que la lecture
+        st.session_state.file_lignes = lignes
+    df_page = lignes.iloc[:page_size]
 
-    start, end = (page - 1) * page_size, page * page_size
-    df_page = df_autres.iloc[start:end]
+    if df_page.empty:
+        # Fin de file atteinte (opérations catégorisées ailleurs entre-temps)
+        reinitialiser_file()
+        st.rerun()
+
+    total = nb_a_traiter()
+    rang = st.session_state.file_rang
 
     categories = [
         "Abonnements", "Alimentation", "Banque", "Logement",
@@ -268,39 +317,49 @@ else:
 
     with st.form("categorisation_form"):
         new_cats = {}
-        st.write(f"📄 Page {page}/{total_pages}")
+        st.write(f"📄 Opérations {rang + 1} à {rang + len(df_page)} sur {total}")
 
         for _, row in df_page.iterrows():
             st.markdown(f"### 💳 {row['Libellé']}")
             st.caption(f"{row['Date'].strftime('%d/%m/%Y')} — {row['Débit euros']} €")
 
+            # Aucun choix par défaut : une opération non cochée reste dans la file
             new_cat = st.radio(
                 "Choisir une catégorie :",
                 categories,
+                index=None,
                 key=f"cat_{row['id']}",
                 horizontal=True,
             )
-            new_cats[row["id"]] = new_cat
+            if new_cat is not None:
+                new_cats[row["id"]] = new_cat
             st.divider()
 
         submit = st.form_submit_button("✅ Enregistrer les changements")
 
-        if submit:
-            with engine.begin() as conn:
-                for idx, cat in new_cats.items():
-                    if cat == "Autres":
-                        conn.execute(text("""
-                            UPDATE operations
-                            SET "Traitee" = TRUE
-                            WHERE id = :idx
-                        """), {"idx": idx})
-                    else:
-                        conn.execute(text("""
-                            UPDATE operations
-                            SET "Categorie" = :cat, "Traitee" = TRUE
-                            WHERE id = :idx
-                        """), {"cat": cat, "idx": idx})
-
+        if submit and not new_cats:
+            st.warning("Aucune catégorie choisie sur cette page.")
+        elif submit:
+            # Tous les choix de la page en une seule requête
+            enregistrer_categories(new_cats)
+            # Les opérations enregistrées sortent de la file : même curseur, les
+            # non cochées restent en tête et la page suivante (déjà lue) complète
+            st.session_state.file_lignes = lignes[~lignes["id"].isin(list(new_cats))]
             st.success("✅ Modifications enregistrées !")
             st.rerun()
 
+    precedente, debut_file, suivante = st.columns(3)
+    if precedente.button("⬅️ Page précédente", disabled=not st.session_state.file_pile):
+        st.session_state.file_curseur, st.session_state.file_rang = st.session_state.file_pile.pop()
+        st.session_state.file_lignes = None
+        st.rerun()
+    if debut_file.button("⏮️ Début de la file", disabled=st.session_state.file_curseur is None):
+        reinitialiser_file()
+        st.rerun()
+    if suivante.button("Page suivante ➡️", disabled=rang + len(df_page) >= total):
+        dernier = df_page.iloc[-1]
+        st.session_state.file_pile.append((st.session_state.file_curseur, rang))
+        st.session_state.file_curseur = (dernier["Date"], dernier["id"])
+        st.session_state.file_rang = rang + len(df_page)
+        st.session_state.file_lignes = lignes.iloc[page_size:]
+        st.rerun()
@@ -5,7 +5,7 @@ import pandas as pd
 import sys, os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from db import engine
+from app.donnees import avertir_hors_ligne, operations_contenant, revenus_mensuels, soldes, virements_internes
 
 # ==========================================================
 #                  INITIALISATION
@@ -14,31 +14,22 @@ from db import engine
 
 st.session_state.sidebar_closed = True
 st.set_page_config(initial_sidebar_state="collapsed", layout="wide")
+avertir_hors_ligne()
 
-df = pd.read_sql("SELECT * FROM operations", engine)
-
-
-df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
-df["Mois"] = df["Date"].dt.to_period("M")
+# Épargne et salaires par (Mois, Compte) depuis la vue matérialisée, en cache
+df_mensuel = revenus_mensuels()
 
 # ==========================================================
 #                  IDENTIFICATION EPARGNE
 # ==========================================================
 
 
-# Normaliser le libellé 
-df["Libellé_upper"] = df["Libellé"].astype(str).str.upper()
-df["Virement_interne"] = df["Libellé_upper"].str.contains(
-    r"(?s)(?=.*VIREMENT)(?=.*BARREAU)(?=.*JOSEPH)(?!.*LOYER)",
-    regex=True,
-    na=False
-)
-# Filtrer uniquement les virements internes réellement entre comptes
-df_virements = df[df["Virement_interne"] == True]
+# Virements internes réellement entre comptes (VIREMENT + BARREAU + JOSEPH, hors LOYER)
+df_virements = virements_internes()
 
 # Virements sortants du compte courant vers épargne
 # Détection des virements internes sortants (courant -> épargne)
-df_virements_sortants = df_virements[df_virements["Compte"] == 1]
+df_virements_sortants = df_mensuel[(df_mensuel["Compte"] == 1) & (df_mensuel["nb_virements"] > 0)]
 
 if not df_virements_sortants.empty:
 
@@ -52,7 +43,7 @@ if not df_virements_sortants.empty:
     # --- 2️⃣ Calcul des montants d'épargne par mois ---
     epargne_mensuelle = (
         df_virements_sortants
-        .groupby("Mois")["Débit euros"]
+        .groupby("Mois")["Épargne"]
         .sum()
         .reindex(mois_range, fill_value=0)   # ✅ Remplir les mois sans virement par 0
     )
@@ -74,8 +65,9 @@ st.metric("💰 Épargne moyenne par mois", format_euro(epargne_moyenne))
 import altair as alt
 
 # Évolution du solde courant
+df_soldes = soldes()
 df_solde = (
-    df[df["Compte"] == 1]    # compte courant
+    df_soldes[df_soldes["Compte"] == 1]    # compte courant
     .sort_values("Date")[["Date", "Solde courant"]]
 )
 
@@ -114,26 +106,23 @@ st.altair_chart(chart_solde + chart_virements, use_container_width=True)
 # ==========================================================
 
 
-# Détection des salaires (crédit sur un compte avec mention SALAIRE)
-df["Salaire"] = df["Libellé_upper"].str.contains("SALAIRE", na=False)
-
-# On ne garde que les crédits liés au salaire
-df_salaires = df[(df["Salaire"] == True) & (df["Crédit euros"].notna())].copy()
+# Salaires (crédits avec mention SALAIRE), déjà sommés par mois dans la vue
+df_salaires = df_mensuel[df_mensuel["Salaire"].notna()].copy()
 
 # Salaire mensuel
 salaire_mensuel = (
-    df_salaires.groupby("Mois")["Crédit euros"]
+    df_salaires.groupby("Mois")["Salaire"]
     .sum()
-    .reindex(df["Mois"].unique())  # garde tous les mois même si pas de salaire
+    .reindex(df_mensuel["Mois"].unique())  # garde tous les mois même si pas de salaire
     .fillna(0)
 )
 
 salaire_moyen_par_mois = salaire_mensuel.mean()
 
-df_salaires["Année"] = df_salaires["Date"].dt.year
+df_salaires["Année"] = df_salaires["Mois"].dt.year
 
 salaire_annuel = (
-    df_salaires.groupby("Année")["Crédit euros"]
+    df_salaires.groupby("Année")["Salaire"]
     .sum()
 )
 
@@ -159,9 +148,8 @@ st.write("")
 
 st.subheader("📩 Virements reçus — ANDREA")
 
-# 1. Filtrage des opérations contenant "ANDREA" dans le libellé
-# On utilise la colonne Libellé_upper créée plus haut pour ignorer la casse
-df_andrea = df[df["Libellé_upper"].str.contains("ANDREA", na=False)].copy()
+# 1. Filtrage des opérations contenant "ANDREA" dans le libellé (sans tenir compte de la casse)
+df_andrea = operations_contenant("ANDREA")
 
 if not df_andrea.empty:
     # On ne garde que les colonnes pertinentes et on trie par date
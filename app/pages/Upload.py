@@ -13,72 +13,74 @@ if root_path not in sys.path:
     sys.path.insert(0, root_path)
 
 # --- MAINTENANT LES IMPORTS FONCTIONNERONT ---
-from db import engine
-from scripts.A_traitement_donnees import traiter_fichier_bancaire
-from scripts.B_depenses import appliquer_regex, appliquer_fuzzy
-from sqlalchemy import text
+from scripts.instrumentation import decrire
+from scripts.taches import lire_tache, soumettre
+from app.donnees import get_engine, hors_ligne, invalider
+
+INTERVALLE_SUIVI = 1  # secondes entre deux lectures de l'état de la tâche
 
 st.title("📥 Ajouter de nouvelles données")
 
 uploaded_file = st.file_uploader("Glissez le relevé bancaire .xlsx ici", type="xlsx")
 
-if uploaded_file is not None:
-    if st.button("Lancer l'intégration à PostgreSQL"):
-        try:
-            with st.status("Traitement du pipeline...", expanded=True) as status:
-                
-                # 1. Charger l'existant
-                st.write("Récupération de la base actuelle...")
-                df_remote = pd.read_sql("SELECT * FROM operations;", engine)
-                df_remote["Date"] = pd.to_datetime(df_remote["Date"])
+modes = {
+    "Incrémental (nouvelles opérations uniquement)": "incremental",
+    "Reconstruction complète de la table": "reconstruction",
+}
+mode_label = st.radio("Mode d'intégration", list(modes), horizontal=True)
+mesurer_memoire = st.checkbox("Mesurer le pic mémoire de chaque étape (plus lent)")
 
-                # 2. Sauvegarde temporaire de l'upload
-                temp_path = "temp_upload.xlsx"
-                with open(temp_path, "wb") as f:
-                    f.write(uploaded_file.getbuffer())
+if hors_ligne():
+    st.error("📴 Base de données injoignable : intégration impossible pour le moment.")
+elif uploaded_file is not None:
+    if st.button("Lancer l'intégration à PostgreSQL"):
+        get_engine()  # migrations appliquées avant de confier le fichier au thread de travail
+        # L'intégration tourne en arrière-plan, sur les octets de l'upload (getvalue()
+        # renvoie le tampon reçu sans copie, aucun fichier écrit sur disque) ; la page
+        # ne garde que l'identifiant (le même fichier déjà en cours n'est pas relancé)
+        st.session_state["tache_upload"] = soumettre(
+            uploaded_file.getvalue(), uploaded_file.name, modes[mode_label], mesurer_memoire
+        )
 
-                # 3. Ton Pipeline de traitement
-                st.write("Analyse du nouveau fichier...")
-                df_nouveau = traiter_fichier_bancaire(temp_path)
-                df_nouveau = appliquer_regex(df_nouveau)
-                df_nouveau["Date"] = pd.to_datetime(df_nouveau["Date"])
 
-                # 4. Déduplication (Logique de ton master.py)
-                colonnes_communes = list(set(df_remote.columns) & set(df_nouveau.columns))
-                date_max_remote = df_remote["Date"].max()
-                
-                df_nouveau_filtre = df_nouveau[df_nouveau["Date"] >= date_max_remote]
-                df_concat = pd.concat([df_remote[colonnes_communes], df_nouveau_filtre[colonnes_communes]], ignore_index=True)
-                
-                mask_date_max = df_concat["Date"] == date_max_remote
-                df_concat = df_concat[~(mask_date_max & df_concat[mask_date_max].duplicated(subset=["Date", "Libellé", "Montant", "Compte"], keep="first"))]
+def afficher_progression(tache) -> None:
+    for message in list(tache.messages):
+        st.write(message)
+    # Durée, lignes et pic mémoire de chaque étape terminée (table pipeline_runs)
+    for mesure in list(tache.execution.etapes):
+        st.caption(decrire(mesure))
 
-                # 5. Classification Fuzzy
-                st.write("Classification Fuzzy...")
-                df_final = appliquer_fuzzy(df_concat)
 
-                # 6. Push SQL (Méthode de remplacement propre)
-                st.write("Mise à jour de la base de données...")
-                df_final = df_final.reset_index(drop=True)
-                df_final.insert(0, "id", df_final.index + 1)
-                
-                with engine.connect() as conn:
-                    conn.execute(text("DROP TABLE IF EXISTS operations_temp CASCADE;"))
-                    conn.commit()
+@st.fragment(run_every=INTERVALLE_SUIVI)
+def suivre_tache(id_tache: str) -> None:
+    """Relu toutes les INTERVALLE_SUIVI secondes tant que la tâche tourne."""
+    tache = lire_tache(id_tache)
+    if tache is None or not tache.active:
+        # Fin de la tâche : la page entière affiche le résultat (et arrête le suivi)
+        st.rerun()
+    libelle = "⏳ En attente d'une autre intégration..." if tache.etat == "en_attente" else "Traitement du pipeline..."
+    with st.status(f"{libelle} ({tache.nom_fichier})", expanded=True):
+        afficher_progression(tache)
 
-                df_final.to_sql("operations_temp", engine, if_exists="replace", index=False)
 
-                with engine.begin() as conn:
-                    conn.execute(text("ALTER TABLE operations_temp ADD PRIMARY KEY (id);"))
-                    conn.execute(text("DROP TABLE IF EXISTS operations_old CASCADE;"))
-                    conn.execute(text("ALTER TABLE operations RENAME TO operations_old;"))
-                    conn.execute(text("ALTER TABLE operations_temp RENAME TO operations;"))
+id_tache = st.session_state.get("tache_upload")
+tache = lire_tache(id_tache) if id_tache else None
 
-                os.remove(temp_path)
-                status.update(label="✅ Données synchronisées !", state="complete")
-            
+if tache is not None and tache.active:
+    suivre_tache(tache.id)
+elif tache is not None:
+    if tache.etat == "terminee":
+        with st.status("✅ Données synchronisées !", state="complete", expanded=True):
+            afficher_progression(tache)
+            st.dataframe(tache.execution.resume(), hide_index=True)
+        # Caches vidés une seule fois par tâche, pas à chaque rechargement de la page
+        if st.session_state.get("tache_upload_invalidee") != tache.id:
+            st.session_state["tache_upload_invalidee"] = tache.id
+            invalider()
             st.balloons()
-            st.success("La base de données est à jour.")
-
-        except Exception as e:
-            st.error(f"Erreur lors du traitement : {e}")
\ No newline at end of file
+        st.success("La base de données est à jour.")
+    else:
+        with st.status("❌ Intégration interrompue", state="error", expanded=True):
+            afficher_progression(tache)
+            st.dataframe(tache.execution.resume(), hide_index=True)
+        st.error(f"Erreur lors du traitement : {tache.erreur}")
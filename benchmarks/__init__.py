@@ -0,0 +1,12 @@
+# ======================================================
+# ⏱️ Benchmarks du traitement des relevés
+# ======================================================
+# - generateur.py : relevés Excel synthétiques au format Crédit Agricole
+# - executer.py   : chronométrage de chaque étape, résultats en JSON
+# - imports.py    : temps d'import des modules (python -X importtime)
+# - comparer.py   : comparaison de deux fichiers de résultats
+#
+#   python -m benchmarks --tailles 1000 10000
+#   python -m benchmarks.imports
+#   python -m benchmarks.comparer resultats/avant.json resultats/apres.json
+# ======================================================
@@ -0,0 +1,5 @@
+import sys
+
+from benchmarks.executer import main
+
+sys.exit(main())
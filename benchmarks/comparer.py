@@ -0,0 +1,90 @@
+# ======================================================
+# ⚖️ Comparaison de deux exécutions du benchmark
+# ======================================================
+#   python -m benchmarks.comparer resultats/avant.json resultats/apres.json
+#
+# Les mesures sont appariées par (étape, taille) et comparées sur la
+# médiane. Code de sortie 1 si une étape ralentit au-delà de --seuil :
+# utilisable pour bloquer une régression avant de fusionner.
+# ======================================================
+
+import argparse
+import json
+import sys
+
+import pandas as pd
+
+SEUIL_REGRESSION = 1.2  # ratio après / avant
+
+
+def charger_resultats(chemin: str) -> dict:
+    with open(chemin, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def comparer(avant: dict, apres: dict) -> pd.DataFrame:
+    """Médianes avant / après et ratio, par (etape, taille) mesurée dans les deux exécutions."""
+    colonnes = ["etape", "taille", "mediane_s"]
+    df = pd.merge(
+        pd.DataFrame(avant["mesures"], columns=colonnes),
+        pd.DataFrame(apres["mesures"], columns=colonnes),
+        on=["etape", "taille"],
+        suffixes=("_avant", "_apres"),
+    )
+    df["ratio"] = df["mediane_s_apres"] / df["mediane_s_avant"]
+    return df
+
+
+def avertissements(avant: dict, apres: dict) -> list[str]:
+    """Différences de contexte qui faussent la comparaison (machine, base, bibliothèques)."""
+    messages = []
+    for cle in ["machine", "versions", "base"]:
+        if avant.get(cle) != apres.get(cle):
+            messages.append(f"⚠️ {cle} différent(e) : {avant.get(cle)} → {apres.get(cle)}")
+    return messages
+
+
+def main(arguments=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.comparer",
+        description="Compare deux fichiers de résultats du benchmark.",
+    )
+    parser.add_argument("avant", help="résultats de référence (JSON)")
+    parser.add_argument("apres", help="résultats à comparer (JSON)")
+    parser.add_argument(
+        "--seuil", type=float, default=SEUIL_REGRESSION,
+        help=f"ratio après / avant au-delà duquel une étape est en régression (défaut : {SEUIL_REGRESSION})",
+    )
+    args = parser.parse_args(arguments)
+
+    avant, apres = charger_resultats(args.avant), charger_resultats(args.apres)
+    print(f"⚖️ {avant.get('commit')} ({avant.get('date')}) → {apres.get('commit')} ({apres.get('date')})")
+    for message in avertissements(avant, apres):
+        print(message)
+
+    df = comparer(avant, apres)
+    if df.empty:
+        print("⚠️ Aucune mesure commune aux deux exécutions.")
+        return 0
+
+    largeur = df["etape"].str.len().max()
+    regressions = 0
+    for m in df.itertuples():
+        if m.ratio > args.seuil:
+            marque = "🔺"
+            regressions += 1
+        elif m.ratio < 1 / args.seuil:
+            marque = "🟢"
+        else:
+            marque = "  "
+        print(f"{marque} {m.etape:<{largeur}} {m.taille:>8}  {m.mediane_s_avant:9.4f} s → {m.mediane_s_apres:9.4f} s  (×{m.ratio:.2f})")
+
+    if regressions:
+        print(f"❌ {regressions} étape(s) en régression (ratio > {args.seuil})")
+        return 1
+    print("✅ Aucune régression")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,226 @@
+# ======================================================
+# ⏱️ Chronométrage des étapes du traitement d'un relevé
+# ======================================================
+# Pour chaque taille de relevé (nombre d'opérations), un fichier synthétique
+# est généré puis chaque étape est chronométrée (meilleur temps et médiane
+# sur plusieurs répétitions, journal des fonctions mis en sourdine) :
+#   lecture        traiter_fichier_bancaire
+#   regex          appliquer_regex
+#   fuzzy          appliquer_fuzzy (rapidfuzz)
+#   ngrammes       appliquer_fuzzy(methode="ngrammes")
+#   dedoublonnage  fusion de deux relevés qui se chevauchent de moitié
+#   ecriture       copier_dataframe (COPY sur PostgreSQL, to_sql sinon)
+#   integration    integrer_incremental dans une table vide (fuzzy compris)
+#   reintegration  integrer_incremental du même relevé (tout déjà présent)
+# Les deux dernières étapes demandent PostgreSQL : elles tournent dans un
+# schéma dédié (SCHEMA_BENCHMARK), supprimé à la fin, sans toucher aux
+# tables de l'application.
+#
+# Résultats : un fichier JSON par exécution dans benchmarks/resultats/,
+# à comparer avec `python -m benchmarks.comparer`.
+# ======================================================
+
+import argparse
+import contextlib
+import datetime as dt
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import rapidfuzz
+import sqlalchemy
+from sqlalchemy import create_engine, text
+
+from benchmarks.generateur import generer_releve
+from db import copier_dataframe
+from scripts.A_traitement_donnees import traiter_fichier_bancaire
+from scripts.B_depenses import appliquer_fuzzy, appliquer_regex
+from scripts.dedoublonnage import ajouter_empreintes
+from scripts.ingestion import integrer_incremental
+from scripts.pipeline import fusionner_releves
+
+ETAPES = ("lecture", "regex", "fuzzy", "ngrammes", "dedoublonnage", "ecriture", "integration", "reintegration")
+ETAPES_POSTGRES = ("integration", "reintegration")
+TAILLES = [1000, 10000]
+SCHEMA_BENCHMARK = "benchmark_budget"
+DOSSIER_RESULTATS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resultats")
+
+
+def chronometrer(fonction, repetitions: int = 3, preparer=None) -> tuple[list[float], object]:
+    """
+    Exécute `fonction` `repetitions` fois, sortie standard mise en sourdine.
+    `preparer` (non chronométré) est appelé avant chaque exécution.
+    Renvoie les durées (s) et le résultat de la dernière exécution.
+    """
+    durees = []
+    resultat = None
+    for _ in range(repetitions):
+        with contextlib.redirect_stdout(io.StringIO()):
+            if preparer is not None:
+                preparer()
+            debut = time.perf_counter()
+            resultat = fonction()
+            durees.append(time.perf_counter() - debut)
+    return durees, resultat
+
+
+# -----------------------------
+# Base de données mesurée
+# -----------------------------
+def creer_engine_benchmark(url: str):
+    """Engine de la base mesurée ; sur PostgreSQL, limité au schéma SCHEMA_BENCHMARK."""
+    if url.startswith("postgresql"):
+        return create_engine(url, connect_args={"options": f"-csearch_path={SCHEMA_BENCHMARK}"})
+    return create_engine(url)
+
+
+def reinitialiser_base(engine) -> None:
+    """Schéma de benchmark vidé (PostgreSQL) : la prochaine intégration part d'une base neuve."""
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA_BENCHMARK} CASCADE;"))
+        conn.execute(text(f"CREATE SCHEMA {SCHEMA_BENCHMARK};"))
+
+
+def supprimer_base(engine) -> None:
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA_BENCHMARK} CASCADE;"))
+    engine.dispose()
+
+
+# -----------------------------
+# Mesures
+# -----------------------------
+def mesurer(taille: int, engine, dossier: str, comptes: int = 3, repetitions: int = 3, etapes=ETAPES) -> list[dict]:
+    """Chronomètre les `etapes` sur un relevé synthétique de `taille` opérations."""
+    chemin = generer_releve(os.path.join(dossier, f"releve_{taille}.xlsx"), taille, comptes)
+    mesures = []
+
+    def noter(etape, fonction, preparer=None):
+        durees, resultat = chronometrer(fonction, repetitions, preparer)
+        lignes = len(resultat) if isinstance(resultat, pd.DataFrame) else resultat
+        mesures.append({
+            "etape": etape,
+            "taille": taille,
+            "lignes": int(lignes) if lignes is not None else None,
+            "min_s": round(min(durees), 6),
+            "mediane_s": round(statistics.median(durees), 6),
+            "repetitions": len(durees),
+        })
+        print(f"   ⏱️ {etape:<14} {statistics.median(durees):9.4f} s")
+        return resultat
+
+    # Les étapes suivantes partent du relevé lu et classé, mesuré ou non
+    if "lecture" in etapes:
+        df = noter("lecture", lambda: traiter_fichier_bancaire(chemin))
+    else:
+        df = chronometrer(lambda: traiter_fichier_bancaire(chemin), 1)[1]
+    if "regex" in etapes:
+        df_regex = noter("regex", lambda: appliquer_regex(df))
+    else:
+        df_regex = chronometrer(lambda: appliquer_regex(df), 1)[1]
+
+    if "fuzzy" in etapes:
+        noter("fuzzy", lambda: appliquer_fuzzy(df_regex.copy()))
+    if "ngrammes" in etapes:
+        noter("ngrammes", lambda: appliquer_fuzzy(df_regex.copy(), methode="ngrammes"))
+    if "dedoublonnage" in etapes:
+        releve = ajouter_empreintes(df_regex)
+        recouvrant = releve.iloc[len(releve) // 2:]
+        noter("dedoublonnage", lambda: fusionner_releves([releve, recouvrant]))
+    if "ecriture" in etapes:
+        noter("ecriture", lambda: copier_dataframe(df_regex, "operations_benchmark", engine, if_exists="replace"))
+
+    if engine.dialect.name == "postgresql":
+        if "integration" in etapes:
+            noter(
+                "integration",
+                lambda: integrer_incremental(df_regex.copy(), engine),
+                preparer=lambda: reinitialiser_base(engine),
+            )
+        if "reintegration" in etapes:
+            if "integration" not in etapes:
+                reinitialiser_base(engine)
+                chronometrer(lambda: integrer_incremental(df_regex.copy(), engine), 1)
+            noter("reintegration", lambda: integrer_incremental(df_regex.copy(), engine))
+    return mesures
+
+
+def contexte(engine=None) -> dict:
+    """Ce qui rend deux résultats comparables ou non : version du code, machine, bibliothèques, base."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=os.path.dirname(DOSSIER_RESULTATS),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "date": dt.datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "machine": {
+            "python": platform.python_version(),
+            "plateforme": platform.platform(),
+            "processeurs": os.cpu_count(),
+        },
+        "versions": {
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "rapidfuzz": rapidfuzz.__version__,
+            "sqlalchemy": sqlalchemy.__version__,
+        },
+        # Jamais l'URL : elle peut contenir un mot de passe
+        "base": engine.dialect.name if engine is not None else None,
+    }
+
+
+def main(arguments=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Chronomètre le traitement de relevés synthétiques et enregistre les résultats en JSON.",
+    )
+    parser.add_argument("--tailles", type=int, nargs="+", default=TAILLES, help="opérations par relevé (défaut : 1000 10000)")
+    parser.add_argument("--comptes", type=int, default=3, help="comptes (sections) par relevé (défaut : 3)")
+    parser.add_argument("-r", "--repetitions", type=int, default=3, help="exécutions par étape (défaut : 3)")
+    parser.add_argument("--etapes", nargs="+", choices=ETAPES, default=list(ETAPES), help="étapes mesurées (défaut : toutes)")
+    parser.add_argument(
+        "--base", default="sqlite://",
+        help="URL SQLAlchemy de la base mesurée (défaut : SQLite en mémoire ; "
+             "PostgreSQL nécessaire pour les étapes d'intégration)",
+    )
+    parser.add_argument("--sortie", default=DOSSIER_RESULTATS, help="dossier des résultats JSON")
+    args = parser.parse_args(arguments)
+
+    engine = creer_engine_benchmark(args.base)
+    if engine.dialect.name != "postgresql" and set(args.etapes) & set(ETAPES_POSTGRES):
+        print(f"⚠️ Base {engine.dialect.name} : étapes {', '.join(ETAPES_POSTGRES)} ignorées (PostgreSQL requis)")
+
+    resultats = contexte(engine)
+    resultats["parametres"] = {"tailles": args.tailles, "comptes": args.comptes, "repetitions": args.repetitions}
+    resultats["mesures"] = []
+
+    reinitialiser_base(engine)
+    try:
+        with tempfile.TemporaryDirectory() as dossier:
+            for taille in args.tailles:
+                print(f"📏 Relevé de {taille} opérations")
+                resultats["mesures"] += mesurer(taille, engine, dossier, args.comptes, args.repetitions, args.etapes)
+    finally:
+        supprimer_base(engine)
+
+    os.makedirs(args.sortie, exist_ok=True)
+    nom = f"{dt.datetime.now():%Y%m%d-%H%M%S}_{resultats['commit'] or 'inconnu'}.json"
+    chemin = os.path.join(args.sortie, nom)
+    with open(chemin, "w", encoding="utf-8") as f:
+        json.dump(resultats, f, ensure_ascii=False, indent=2)
+    print(f"💾 Résultats enregistrés : {chemin}")
+    return 0
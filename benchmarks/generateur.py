@@ -0,0 +1,168 @@
+# ======================================================
+# 🏭 Générateur de relevés Crédit Agricole synthétiques
+# ======================================================
+# Classeur .xlsx lisible par traiter_fichier_bancaire, avec la même mise
+# en page qu'un export CA :
+# - quelques lignes d'en-tête (banque, date de téléchargement)
+# - pour chaque compte : une ligne "Solde au JJ/MM/AAAA montant", puis une
+#   section "Date / Date valeur / Libellé / Débit euros / Crédit euros"
+# - des commerçants récurrents (fréquences très inégales, comme sur un vrai
+#   compte), des variantes de libellé (numéro de magasin, date de carte,
+#   fautes de frappe) et des libellés inconnus des regex, pour le fuzzy
+#
+#   python -m benchmarks.generateur releve.xlsx -n 10000 --comptes 3
+# ======================================================
+
+import argparse
+import datetime as dt
+import random
+
+from openpyxl import Workbook
+
+# (libellé, débit min, débit max) : carte, prélèvements, retraits
+COMMERCANTS = [
+    ("CARREFOUR CITY", 2, 80),
+    ("CARREFOUR MARKET", 5, 150),
+    ("MONOPRIX", 3, 90),
+    ("FRANPRIX", 2, 40),
+    ("LIDL", 5, 120),
+    ("BOULANGERIE DU MARCHE", 1, 15),
+    ("UBER EATS", 10, 45),
+    ("DELIVEROO", 12, 50),
+    ("SNCF INTERNET", 15, 180),
+    ("RATP NAVIGO", 86.4, 86.4),
+    ("TOTAL ACCESS", 30, 90),
+    ("AMAZON PAYMENTS", 8, 250),
+    ("FNAC DARTY", 15, 400),
+    ("DECATHLON", 10, 200),
+    ("ZARA FRANCE", 20, 150),
+    ("PHARMACIE DU CENTRE", 3, 60),
+    ("NETFLIX.COM", 13.49, 13.49),
+    ("SPOTIFY", 10.99, 10.99),
+]
+PRELEVEMENTS = [
+    ("PRLV SEPA EDF CLIENTS PARTICULIERS", 45, 130),
+    ("PRLV SEPA FREE MOBILE", 19.99, 19.99),
+    ("PRLV SEPA ORANGE SA", 39.99, 39.99),
+    ("PRLV SEPA ASSURANCE HABITATION", 18, 25),
+    ("COTISATION OFFRE GLOBE TROTTER", 6.5, 6.5),
+]
+CREDITS = [
+    ("VIR SEPA SALAIRE ACME SAS", 2100, 2600),
+    ("VIREMENT RECU REMBOURSEMENT", 10, 300),
+    ("VIR INST BARREAU JOSEPH EPARGNE", 50, 800),
+]
+# Syllabes des commerçants inconnus des regex (classés par fuzzy ou à la main)
+SYLLABES = ["BRA", "SSE", "RIE", "LOU", "MAR", "TIN", "CHE", "VAL", "PIN", "ORE", "DOM", "LEC"]
+
+
+def _variante(libelle: str, date: dt.date, r: random.Random) -> str:
+    """Libellé tel qu'il apparaît sur un relevé : préfixe carte, date, faute ou n° de magasin."""
+    tirage = r.random()
+    if tirage < 0.4:
+        return f"CB {libelle} {date:%d/%m}"
+    if tirage < 0.7:
+        return f"PAIEMENT PAR CARTE X{r.randint(1000, 9999)} {libelle} {date:%d/%m}"
+    if tirage < 0.85:
+        return f"{libelle} {r.randint(1, 99):02d}"
+    if tirage < 0.95 and len(libelle) > 6:
+        # Faute de frappe : une lettre supprimée (libellé manqué par les regex)
+        i = r.randrange(1, len(libelle) - 1)
+        return libelle[:i] + libelle[i + 1:]
+    return libelle
+
+
+def _montant_solde(montant: float) -> str:
+    """Montant au format des relevés : espaces des milliers, virgule décimale."""
+    return f"{montant:,.2f}".replace(",", " ").replace(".", ",")
+
+
+def generer_operations(nb_operations: int, date_fin: dt.date, r: random.Random) -> list[list]:
+    """Lignes (Date, Date valeur, Libellé, Débit euros, Crédit euros), des plus récentes aux plus anciennes."""
+    inconnus = ["".join(r.choices(SYLLABES, k=3)) for _ in range(max(5, nb_operations // 200))]
+    # Loi de Zipf : quelques commerçants font l'essentiel des opérations
+    poids = [1 / (rang + 1) for rang in range(len(COMMERCANTS))]
+
+    lignes = []
+    date = dt.datetime.combine(date_fin, dt.time())
+    for _ in range(nb_operations):
+        if r.random() < 0.6:
+            date -= dt.timedelta(days=1)
+        tirage = r.random()
+        if tirage < 0.65:
+            libelle, minimum, maximum = r.choices(COMMERCANTS, weights=poids)[0]
+            libelle = _variante(libelle, date, r)
+        elif tirage < 0.75:
+            libelle, minimum, maximum = r.choice(PRELEVEMENTS)
+        elif tirage < 0.85:
+            # Sans préfixe "CB" (reconnu par la regex Banque) : reste "Autres"
+            libelle, minimum, maximum = r.choice(inconnus), 5, 120
+            if r.random() < 0.3:
+                libelle = f"{libelle} {r.randint(1, 99):02d}"
+        elif tirage < 0.9:
+            libelle, minimum, maximum = f"RETRAIT AU DISTRIBUTEUR {date:%d/%m}", 20, 100
+        else:
+            libelle, minimum, maximum = r.choice(CREDITS)
+            montant = round(r.uniform(minimum, maximum), 2)
+            lignes.append([date, date, libelle, None, montant])
+            continue
+        lignes.append([date, date, libelle, round(r.uniform(minimum, maximum), 2), None])
+    return lignes
+
+
+def generer_releve(
+    chemin: str,
+    nb_operations: int = 1000,
+    nb_comptes: int = 2,
+    graine: int = 0,
+    date_fin: dt.date | None = None,
+) -> str:
+    """
+    Écrit dans `chemin` un relevé de `nb_operations` opérations réparties
+    entre `nb_comptes` comptes (une section chacun). Même `graine` → même
+    fichier. Renvoie `chemin`.
+    """
+    r = random.Random(graine)
+    date_fin = date_fin or dt.date(2025, 11, 14)
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Relevé"
+    ws.append(["CREDIT AGRICOLE"])
+    ws.append([f"Téléchargé le {date_fin:%d/%m/%Y}"])
+    ws.append([])
+
+    soldes = set()
+    for compte in range(nb_comptes):
+        # Les comptes sont distingués par leur solde final : il doit être unique
+        solde = round(r.uniform(100, 15000), 2)
+        while solde in soldes:
+            solde = round(r.uniform(100, 15000), 2)
+        soldes.add(solde)
+
+        ws.append([f"Compte de Dépôt n° {r.randint(10 ** 10, 10 ** 11 - 1)}"])
+        ws.append([f"Solde au {date_fin:%d/%m/%Y} {_montant_solde(solde)}"])
+        ws.append([])
+        ws.append(["Date", "Date valeur", "Libellé", "Débit euros", "Crédit euros"])
+        taille = nb_operations // nb_comptes + (compte < nb_operations % nb_comptes)
+        for ligne in generer_operations(taille, date_fin, r):
+            ws.append(ligne)
+        ws.append([])
+
+    wb.save(chemin)
+    return chemin
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.generateur",
+        description="Écrit un relevé Crédit Agricole synthétique (.xlsx).",
+    )
+    parser.add_argument("chemin", help="fichier .xlsx à écrire")
+    parser.add_argument("-n", "--operations", type=int, default=1000, help="nombre d'opérations (défaut : 1000)")
+    parser.add_argument("--comptes", type=int, default=2, help="nombre de comptes / sections (défaut : 2)")
+    parser.add_argument("--graine", type=int, default=0, help="graine aléatoire (défaut : 0)")
+    args = parser.parse_args()
+
+    generer_releve(args.chemin, args.operations, args.comptes, args.graine)
+    print(f"🏭 {args.operations} opérations sur {args.comptes} compte(s) → {args.chemin}")
@@ -0,0 +1,111 @@
+# ======================================================
+# 📦 Temps d'import des modules (démarrage à froid)
+# ======================================================
+# Chaque module est importé dans un interpréteur neuf lancé avec
+# `python -X importtime`, plusieurs fois ; on garde le temps cumulé de son
+# import et les paquets les plus coûteux qu'il entraîne.
+# Résultats au même format que `python -m benchmarks` (étape
+# "import <module>", taille 0), comparables avec `python -m benchmarks.comparer`.
+#
+#   python -m benchmarks.imports
+#   python -m benchmarks.imports scripts.pipeline -r 10
+# ======================================================
+
+import argparse
+import datetime as dt
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from benchmarks.executer import DOSSIER_RESULTATS, contexte
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules chargés au démarrage des pages et des scripts d'intégration
+MODULES = [
+    "db",
+    "app.donnees",
+    "scripts.A_traitement_donnees",
+    "scripts.B_depenses",
+    "scripts.ingestion",
+    "scripts.pipeline",
+    "scripts.D_adjust_data",
+]
+NB_PLUS_LOURDS = 8
+
+
+def lire_importtime(sortie: str) -> list[tuple[str, int, int]]:
+    """Lignes de `-X importtime` : (nom indenté, µs propres, µs cumulées)."""
+    lignes = []
+    for ligne in sortie.splitlines():
+        if not ligne.startswith("import time:") or "self [us]" in ligne:
+            continue
+        propre, cumule, nom = ligne[len("import time:"):].split("|")
+        lignes.append((nom[1:], int(propre), int(cumule)))
+    return lignes
+
+
+def mesurer_import(module: str) -> tuple[float, dict]:
+    """Import de `module` dans un nouvel interpréteur : durée cumulée (s) et paquets les plus lourds."""
+    resultat = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=RACINE,
+    )
+    if resultat.returncode != 0:
+        raise RuntimeError(f"❌ Import de {module} impossible :\n{resultat.stderr[-2000:]}")
+
+    lignes = lire_importtime(resultat.stderr)
+    total = next(cumule for nom, _, cumule in lignes if nom == module)
+    # Paquets de premier niveau (sans point) chargés pendant l'import, du plus lourd au plus léger
+    paquets = {}
+    for nom, _, cumule in lignes:
+        nom = nom.strip()
+        if "." not in nom and nom != module:
+            paquets[nom] = max(paquets.get(nom, 0), cumule)
+    plus_lourds = dict(sorted(paquets.items(), key=lambda p: -p[1])[:NB_PLUS_LOURDS])
+    return total / 1e6, {nom: round(us / 1e6, 4) for nom, us in plus_lourds.items()}
+
+
+def main(arguments=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.imports",
+        description="Mesure le temps d'import des modules (python -X importtime) et l'enregistre en JSON.",
+    )
+    parser.add_argument("modules", nargs="*", default=MODULES, help="modules à importer (défaut : pages et scripts)")
+    parser.add_argument("-r", "--repetitions", type=int, default=5, help="imports par module (défaut : 5)")
+    parser.add_argument("--sortie", default=DOSSIER_RESULTATS, help="dossier des résultats JSON")
+    args = parser.parse_args(arguments)
+
+    resultats = contexte()
+    resultats["parametres"] = {"modules": args.modules, "repetitions": args.repetitions}
+    resultats["mesures"] = []
+
+    for module in args.modules:
+        durees = []
+        for _ in range(args.repetitions):
+            duree, plus_lourds = mesurer_import(module)
+            durees.append(duree)
+        resultats["mesures"].append({
+            "etape": f"import {module}",
+            "taille": 0,
+            "lignes": None,
+            "min_s": round(min(durees), 6),
+            "mediane_s": round(statistics.median(durees), 6),
+            "repetitions": len(durees),
+            "plus_lourds": plus_lourds,
+        })
+        detail = ", ".join(f"{nom} {s:.2f}" for nom, s in list(plus_lourds.items())[:4])
+        print(f"📦 {module:<30} {statistics.median(durees):7.3f} s   ({detail})")
+
+    os.makedirs(args.sortie, exist_ok=True)
+    chemin = os.path.join(args.sortie, f"{dt.datetime.now():%Y%m%d-%H%M%S}_{resultats['commit'] or 'inconnu'}_imports.json")
+    with open(chemin, "w", encoding="utf-8") as f:
+        json.dump(resultats, f, ensure_ascii=False, indent=2)
+    print(f"💾 Résultats enregistrés : {chemin}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
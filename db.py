@@ -1,17 +1,198 @@
+import io
 import os
-from dotenv import load_dotenv
-from sqlalchemy import create_engine
+import threading
 
-load_dotenv()
+import pandas as pd
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
 
-# On cherche d'abord la nouvelle variable, sinon l'ancienne
-db_url = os.getenv("DATABASE_PUBLIC_URL") or os.getenv("DATABASE_URL")
+# -----------------------------
+# Engines, créés au premier usage
+# -----------------------------
+# Rien n'est lu ni créé à l'import : le .env, l'URL et le pool de connexions
+# le sont au premier appel de get_engine(). Un engine par rôle et par
+# processus, dont le pool est partagé par les reruns et sessions Streamlit :
+# - "ecriture" : DATABASE_PUBLIC_URL, sinon DATABASE_URL
+# - "lecture"  : DATABASE_READ_URL (réplica) si défini, sinon la même base,
+#                avec son propre pool et des transactions en lecture seule
+#
+# Réglages PostgreSQL (variables d'environnement, valeurs par défaut) :
+#   DB_POOL_SIZE=5  DB_MAX_OVERFLOW=10  DB_POOL_RECYCLE=1800 (s)
+#   DB_STATEMENT_TIMEOUT_MS : 30000 en lecture, 0 (aucun) en écriture
+# Une URL sqlite:// est acceptée pour les essais locaux (copier_dataframe,
+# benchmarks) ; les migrations de scripts/schema.py restent propres à PostgreSQL.
 
-if db_url is None:
-    raise Exception("❌ Aucune URL de base de données détectée")
+ROLES = ("ecriture", "lecture")
+DELAI_REQUETE_MS = {"ecriture": 0, "lecture": 30_000}
 
-# Si l'URL contient "internal", on affiche un avertissement car ça va planter hors de Railway
-if "internal" in db_url:
-    print("⚠️ Attention : Utilisation d'une adresse interne Railway.")
+_engines = {}
+_verrou_engines = threading.Lock()
 
-engine = create_engine(db_url)
\ No newline at end of file
+
+def _parametre(nom: str, defaut: int) -> int:
+    return int(os.getenv(nom, defaut))
+
+
+def url_base(role: str = "ecriture") -> str:
+    """URL de la base pour `role` (variables d'environnement, puis .env)."""
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    # On cherche d'abord la nouvelle variable, sinon l'ancienne
+    url = os.getenv("DATABASE_PUBLIC_URL") or os.getenv("DATABASE_URL")
+    if role == "lecture":
+        url = os.getenv("DATABASE_READ_URL") or url
+    if url is None:
+        raise RuntimeError("❌ Aucune URL de base de données détectée")
+    return url
+
+
+def get_engine(role: str = "ecriture") -> Engine:
+    """Engine partagé de `role` ("ecriture" ou "lecture"), créé au premier appel."""
+    if role not in ROLES:
+        raise ValueError(f"❌ Rôle inconnu : {role} (attendu : {', '.join(ROLES)})")
+    # Sessions Streamlit concurrentes : un seul pool par rôle
+    with _verrou_engines:
+        if role not in _engines:
+            _engines[role] = _creer_engine(role)
+        return _engines[role]
+
+
+def _creer_engine(role: str) -> Engine:
+    url = url_base(role)
+
+    # Si l'URL contient "internal", on affiche un avertissement car ça va planter hors de Railway
+    if "internal" in url:
+        print("⚠️ Attention : Utilisation d'une adresse interne Railway.")
+
+    if url.startswith("sqlite"):
+        return create_engine(url)
+
+    options = f"-c statement_timeout={_parametre('DB_STATEMENT_TIMEOUT_MS', DELAI_REQUETE_MS[role])}"
+    if role == "lecture":
+        options += " -c default_transaction_read_only=on"
+    return create_engine(
+        url,
+        pool_size=_parametre("DB_POOL_SIZE", 5),
+        max_overflow=_parametre("DB_MAX_OVERFLOW", 10),
+        pool_recycle=_parametre("DB_POOL_RECYCLE", 1800),
+        # Connexion vérifiée avant usage : une connexion coupée par le serveur
+        # (mise en veille, redémarrage) est remplacée au lieu de faire échouer la page
+        pool_pre_ping=True,
+        connect_args={"options": options},
+    )
+
+
+def fermer_engines() -> None:
+    """Ferme les pools ; les engines seront recréés au prochain get_engine()."""
+    with _verrou_engines:
+        for moteur in _engines.values():
+            moteur.dispose()
+        _engines.clear()
+
+
+def __getattr__(nom: str):
+    # `db.engine` / `from db import engine` : engine d'écriture, créé à la demande
+    if nom == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {nom!r}")
+
+
+def _identifiant(nom: str) -> str:
+    """Entoure un nom de table / colonne de guillemets (ex. "Libellé", "Débit euros")."""
+    return '"' + str(nom).replace('"', '""') + '"'
+
+
+def copier_dataframe(
+    df,
+    table: str,
+    conn=None,
+    if_exists: str = "append",
+    taille_lot: int = 100_000,
+    temporaire: bool = False,
+) -> int:
+    """
+    Écrit un DataFrame dans `table` avec COPY ... FROM STDIN (psycopg2),
+    au lieu des INSERT ligne à ligne de `DataFrame.to_sql`.
+
+    Le schéma est celui que créerait `to_sql` (`pd.io.sql.get_schema`,
+    `if_exists` respecté), puis les lignes sont envoyées par lots de
+    `taille_lot` au format CSV. `conn` est une Connection ou un Engine
+    SQLAlchemy (l'engine d'écriture par défaut). Sur un autre moteur que
+    PostgreSQL, repli sur `to_sql`. Renvoie le nombre de lignes écrites.
+
+    Avec `temporaire`, `table` est une table de travail temporaire (CREATE
+    TEMPORARY TABLE ... ON COMMIT DROP) : propre à la session, elle ne
+    gêne pas une autre écriture simultanée et disparaît avec la transaction.
+    Sur un autre moteur, la table est remplacée à chaque appel.
+    """
+    if conn is None:
+        conn = get_engine()
+    if isinstance(conn, Engine):
+        # Engine → une transaction dédiée
+        with conn.begin() as connexion:
+            return copier_dataframe(df, table, connexion, if_exists=if_exists, taille_lot=taille_lot, temporaire=temporaire)
+
+    if conn.dialect.name != "postgresql":
+        # Table de travail : recréée à chaque appel, jamais complétée par un appel précédent
+        if temporaire:
+            if_exists = "replace"
+        df.to_sql(table, conn, if_exists=if_exists, index=False, method="multi", chunksize=1000)
+        return len(df)
+
+    # Schéma déduit de tout le DataFrame, comme le ferait to_sql
+    schema = pd.io.sql.get_schema(df, table, con=conn).strip()
+    if temporaire:
+        conn.execute(text(f"DROP TABLE IF EXISTS pg_temp.{_identifiant(table)};"))
+        conn.execute(text(schema.replace("CREATE TABLE", "CREATE TEMPORARY TABLE", 1) + " ON COMMIT DROP;"))
+    else:
+        existe = inspect(conn).has_table(table)
+        if existe and if_exists == "fail":
+            raise ValueError(f"❌ La table '{table}' existe déjà.")
+        if existe and if_exists == "replace":
+            conn.execute(text(f"DROP TABLE {_identifiant(table)};"))
+        if not existe or if_exists == "replace":
+            conn.execute(text(schema))
+
+    colonnes = ", ".join(_identifiant(c) for c in df.columns)
+    requete = f"COPY {_identifiant(table)} ({colonnes}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+
+    curseur = conn.connection.cursor()
+    try:
+        for debut in range(0, len(df), taille_lot):
+            tampon = io.StringIO()
+            df.iloc[debut:debut + taille_lot].to_csv(tampon, index=False, header=False, na_rep="\\N")
+            tampon.seek(0)
+            curseur.copy_expert(requete, tampon)
+    finally:
+        curseur.close()
+
+    return len(df)
+
+
+# -----------------------------
+# Jeton de fraîcheur des tables
+# -----------------------------
+def incrementer_version(conn, table: str = "operations") -> None:
+    """
+    Incrémente le compteur de version de `table` (à appeler dans la transaction
+    qui la modifie). Les caches de l'application se basent sur ce compteur.
+    La table table_versions est créée par les migrations (scripts/schema.py).
+    """
+    conn.execute(text("""
+        INSERT INTO table_versions (nom, version) VALUES (:nom, 1)
+        ON CONFLICT (nom) DO UPDATE SET version = table_versions.version + 1;
+    """), {"nom": table})
+
+
+def lire_version(conn, table: str = "operations") -> int:
+    """Version courante de `table` (0 si elle n'a jamais été incrémentée)."""
+    try:
+        with conn.begin_nested():
+            version = conn.execute(
+                text("SELECT version FROM table_versions WHERE nom = :nom;"), {"nom": table}
+            ).scalar()
+    except DBAPIError:
+        return 0
+    return version or 0
@@ -1,22 +1,125 @@
+import io
+import numpy as np
 import pandas as pd
-import re
-from openpyxl import load_workbook
 import os
 
 
-def traiter_fichier_bancaire(fichier: str) -> pd.DataFrame:
+MOTIF_SOLDE = r"Solde au\s+(\d{2}/\d{2}/\d{4})\s+([\d\s,]+)"
+
+
+def lire_grille(fichier_path) -> pd.DataFrame:
     """
-    Traite un fichier bancaire Excel brut (Crédit Agricole, etc.)
-    et renvoie un DataFrame propre avec :
-      - toutes les opérations
-      - le solde final associé
-      - le compte détecté
-      - un calcul de solde courant
+    Lit la première feuille du classeur en une seule passe (openpyxl en mode
+    lecture seule / streaming) et renvoie la grille brute des cellules,
+    sans en-tête, comme `pd.read_excel(header=None)`.
+    `fichier_path` : chemin ou objet fichier binaire (BytesIO, UploadedFile).
+    """
+    # Import à l'appel : openpyxl (~0,1 s) n'est chargé que pour lire un relevé
+    from openpyxl import load_workbook
+
+    wb = load_workbook(fichier_path, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        ws.reset_dimensions()
+        lignes = [list(row) for row in ws.iter_rows(values_only=True)]
+    finally:
+        wb.close()
+
+    # Suppression des lignes vides en fin de feuille
+    while lignes and all(x is None for x in lignes[-1]):
+        lignes.pop()
+
+    return pd.DataFrame(lignes, dtype=object)
+
+
+def detecter_soldes(raw: pd.DataFrame) -> pd.DataFrame:
+    """
+    Repère les lignes "Solde au JJ/MM/AAAA montant" de la grille brute.
+    Renvoie un DataFrame (ligne_solde, date_solde, solde) trié par ligne.
+    """
+    colonnes_soldes = ["ligne_solde", "date_solde", "solde"]
+    if raw.empty:
+        return pd.DataFrame(columns=colonnes_soldes)
+
+    # Concaténation colonne par colonne des cellules de chaque ligne
+    cellules = raw.astype("string")
+    lignes = cellules.iloc[:, 0].str.cat(
+        [cellules[c] for c in cellules.columns[1:]], sep=" ", na_rep=""
+    )
+    lignes = lignes[lignes.str.contains("Solde au", regex=False, na=False)]
+
+    trouves = lignes.str.extract(MOTIF_SOLDE).dropna()
+    montants = trouves[1].str.replace(r"\s", "", regex=True).str.replace(",", ".", regex=False)
+
+    return pd.DataFrame({
+        "ligne_solde": trouves.index.to_numpy(),
+        "date_solde": pd.to_datetime(trouves[0], format="%d/%m/%Y").to_numpy(),
+        "solde": montants.astype(float).to_numpy(),
+    }, columns=colonnes_soldes)
+
+
+def extraire_section(raw: pd.DataFrame, debut: int, fin: int) -> pd.DataFrame:
     """
+    Découpe une section d'opérations dans la grille brute : la ligne `debut`
+    sert d'en-tête, les lignes suivantes jusqu'à `fin` (exclue) de données.
+    Les noms de colonnes suivent la convention de `pd.read_excel`.
+    """
+    colonnes = []
+    vus = {}
+    for i, nom in enumerate(raw.iloc[debut]):
+        nom = f"Unnamed: {i}" if pd.isna(nom) else nom
+        if nom in vus:
+            vus[nom] += 1
+            nom = f"{nom}.{vus[nom]}"
+        else:
+            vus[nom] = 0
+        colonnes.append(nom)
+
+    section = pd.DataFrame(raw.iloc[debut + 1:fin].to_numpy(), columns=colonnes)
+    return section.infer_objects()
+
+
+def calculer_solde_courant(df: pd.DataFrame, cle: str = "Compte") -> pd.Series:
+    """
+    Solde courant de chaque opération, par compte : solde final moins la
+    somme des montants de l'opération jusqu'à la fin du relevé.
+    `df` doit être trié par (cle, Date). Le solde de référence d'un compte est
+    le "Solde final" du relevé le plus récent ("Date solde final" maximale),
+    ce qui permet aussi de recalculer toute la table operations.
+    Calcul en centimes entiers (cumul inversé groupé, sans boucle par compte) ;
+    renvoie des euros en float (NaN si le compte n'a pas de solde final).
+    Un montant manquant compte pour 0 : il ne décale pas le solde des autres opérations.
+    """
+    centimes = (df["Montant"].astype(float).fillna(0) * 100).round().astype("int64")
+    cumul = centimes.groupby(df[cle], sort=False)
+    # Somme de l'opération courante et des suivantes : total - cumul + courant
+    reste = cumul.transform("sum") - cumul.cumsum() + centimes
+
+    dates_soldes = pd.to_datetime(df["Date solde final"])
+    plus_recent = dates_soldes == dates_soldes.groupby(df[cle], sort=False).transform("max")
+    solde_final = (
+        df["Solde final"].astype(float).where(plus_recent)
+        .groupby(df[cle], sort=False).transform("max")
+    )
+
+    return ((solde_final * 100).round() - reste) / 100
 
-    pd.set_option('future.no_silent_downcasting', True)
+
+def ouvrir_source(fichier):
+    """
+    Source du classeur pour `lire_grille` et nom affiché dans le journal :
+      - octets (upload) : enveloppés dans un BytesIO, sans copie ni fichier temporaire
+      - objet fichier (BytesIO, UploadedFile de Streamlit) : rembobiné et lu tel quel
+      - chemin : tel quel s'il existe, sinon relatif au dossier du script
+    """
+    if isinstance(fichier, (bytes, bytearray, memoryview)):
+        return io.BytesIO(fichier), "(en mémoire)"
+    if hasattr(fichier, "read"):
+        fichier.seek(0)
+        return fichier, getattr(fichier, "name", "(en mémoire)")
 
     # ✅ Détermination du chemin du fichier (Version compatible Streamlit)
+    fichier = os.fspath(fichier)
     if os.path.exists(fichier):
         # Si le chemin fourni existe tel quel (chemin absolu ou relatif à la racine)
         fichier_path = fichier
@@ -30,67 +133,67 @@ def traiter_fichier_bancaire(fichier: str) -> pd.DataFrame:
 
     if not os.path.exists(fichier_path):
         raise FileNotFoundError(f"❌ Fichier introuvable : {fichier_path}")
+    return fichier_path, fichier_path
+
+
+def traiter_fichier_bancaire(fichier) -> pd.DataFrame:
+    """
+    Traite un fichier bancaire Excel brut (Crédit Agricole, etc.), donné par
+    son chemin, ses octets ou un objet fichier (voir `ouvrir_source`),
+    et renvoie un DataFrame propre avec :
+      - toutes les opérations
+      - le solde final associé
+      - le compte détecté
+      - un calcul de solde courant
+    """
 
-    print(f"📂 Lecture du fichier : {fichier_path}")
+    source, nom = ouvrir_source(fichier)
+    print(f"📂 Lecture du fichier : {nom}")
 
-    raw = pd.read_excel(fichier_path, header=None, engine="openpyxl")
+    # Lecture unique du classeur : tout le découpage se fait sur cette grille
+    raw = lire_grille(source)
 
     # =====================================================
     # 1️⃣ Détection des lignes "Solde au ..."
     # =====================================================
-    soldes = []
-    for i, row in raw.iterrows():
-        row_str = " ".join(str(x) for x in row if pd.notna(x))
-        match = re.search(r"Solde au\s+(\d{2}/\d{2}/\d{4})\s+([\d\s,]+)", row_str)
-        if match:
-            date_solde = pd.to_datetime(match.group(1), dayfirst=True)
-            montant = (
-                match.group(2)
-                .replace("\xa0", "")
-                .replace("\u202f", "")
-                .replace(" ", "")
-                .replace(",", ".")
-            )
-            soldes.append({
-                "ligne_solde": i,
-                "date_solde": date_solde,
-                "solde": float(montant)
-            })
+    soldes = detecter_soldes(raw)
 
     print(f"✅ {len(soldes)} soldes détectés")
-    for s in soldes:
-        print(f"   - {s['date_solde'].strftime('%d/%m/%Y')} : {s['solde']:.2f} € (ligne {s['ligne_solde']})")
+    for s in soldes.itertuples():
+        print(f"   - {s.date_solde.strftime('%d/%m/%Y')} : {s.solde:.2f} € (ligne {s.ligne_solde})")
 
     # =====================================================
     # 2️⃣ Repérage des sections 'Date / Libellé / Débit / Crédit'
     # =====================================================
-    header_rows = raw[raw.eq("Date").any(axis=1)].index.tolist()
+    header_rows = raw.index[raw.eq("Date").any(axis=1)].tolist()
     print(f"📑 {len(header_rows)} sections d'opérations détectées")
 
+    # Pour chaque section, position du dernier solde situé au-dessus
+    lignes_soldes = soldes["ligne_solde"].to_numpy()
+    positions_soldes = np.searchsorted(lignes_soldes, header_rows, side="left") - 1
+
     dataframes = []
     for idx, start in enumerate(header_rows):
         end = header_rows[idx + 1] if idx + 1 < len(header_rows) else len(raw)
 
-        df_tmp = pd.read_excel(fichier, skiprows=start, nrows=end - start - 1, engine="openpyxl")
+        df_tmp = extraire_section(raw, start, end)
 
         # Garder uniquement les lignes avec une date valide
-        df_tmp = df_tmp[pd.to_datetime(df_tmp["Date"], errors="coerce").notna()].copy()
+        dates = pd.to_datetime(df_tmp["Date"], errors="coerce")
+        df_tmp = df_tmp[dates.notna()].copy()
         df_tmp["Date"] = pd.to_datetime(df_tmp["Date"])
 
         # Trouver le solde au-dessus de ce bloc
-        solde_associe = None
-        for s in sorted(soldes, key=lambda x: x["ligne_solde"], reverse=True):
-            if s["ligne_solde"] < start:
-                solde_associe = s
-                break
+        pos = positions_soldes[idx]
+        solde_associe = soldes.iloc[pos] if pos >= 0 else None
 
         # Si aucune opération trouvée après le solde → ignorer ce compte
         if df_tmp.empty:
-            if solde_associe:
+            if solde_associe is not None:
                 print(f"⚠️ Aucun mouvement trouvé après le solde du {solde_associe['date_solde'].strftime('%d/%m/%Y')} — compte ignoré.")
             continue
 
-        if solde_associe:
+        if solde_associe is not None:
             df_tmp["Solde final"] = solde_associe["solde"]
             df_tmp["Date solde final"] = solde_associe["date_solde"]
 
@@ -107,7 +210,7 @@ def traiter_fichier_bancaire(fichier: str) -> pd.DataFrame:
     # Conversion sécurisée des montants
     for col in ["Débit euros", "Crédit euros"]:
         if col in df.columns:
-            df[col] = df[col].astype(str).replace({",": ".", " ": ""}, regex=True)
+            df[col] = df[col].astype(str).str.replace(",", ".", regex=False).str.replace(" ", "", regex=False)
             df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0)
 
     # Ajouter un ID de compte unique
@@ -122,17 +225,11 @@ def traiter_fichier_bancaire(fichier: str) -> pd.DataFrame:
     # ✅ Calcul du solde courant seulement si Solde final est présent
     if "Solde final" in df.columns and df["Solde final"].notna().any():
         print("🧮 Calcul du solde courant...")
-
-        df["Solde courant"] = pd.NA  # initialise la colonne
-
-        for compte, g in df.groupby("Compte", sort=False):
-            solde_final = g["Solde final"].iloc[0]
-            solde_courant = solde_final - g["Montant"].iloc[::-1].cumsum().iloc[::-1]
-            df.loc[g.index, "Solde courant"] = solde_courant
+        df["Solde courant"] = calculer_solde_courant(df)
 
     else:
         print("⚠️ Aucun solde final valide, solde courant non calculé.")
-        df["Solde courant"] = pd.NA
+        df["Solde courant"] = np.nan
 
     print(f"✅ Données bancaires traitées avec succès : {len(df)} opérations sur {df['Compte'].nunique()} compte(s).")
 
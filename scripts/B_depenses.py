@@ -1,6 +1,8 @@
 import re
+from functools import lru_cache
+
+import numpy as np
 import pandas as pd
-from rapidfuzz import process, fuzz
 
 
 # -----------------------------
@@ -38,37 +40,89 @@ EXCLUSIONS_AUTRES = ["PHARMACIE", "ANDREA"]
 # -----------------------------
 # 1️⃣ Fonction de classification par REGEX
 # -----------------------------
+@lru_cache(maxsize=8)
+def _compiler_regles(categories: tuple, exclusions: tuple):
+    """
+    Compile exclusions + catégories en une seule regex à groupes nommés.
+
+    Chaque règle est une alternative ancrée en début de chaîne qui cherche
+    son motif par anticipation `(?=.*?(?P<rN>...))` : le moteur essaie les
+    alternatives dans l'ordre, la première règle qui trouve un motif gagne,
+    exactement comme les boucles successives de `re.search`.
+    Renvoie (regex compilée, [(groupe, catégorie)]).
+    """
+    regles = [(re.escape(mot), "Autres") for mot in exclusions]
+    regles += [(pattern, categorie) for pattern, categorie in categories]
+
+    groupes = [(f"r{i}", categorie) for i, (_, categorie) in enumerate(regles)]
+    alternatives = [
+        f"(?=.*?(?P<{groupe}>{pattern}))"
+        for (groupe, _), (pattern, _) in zip(groupes, regles)
+    ]
+    regex = re.compile(r"\A(?:" + "|".join(alternatives) + ")", re.DOTALL)
+    return regex, groupes
+
+
+def compiler_regles():
+    """Renvoie le moteur compilé pour les CATEGORIES / EXCLUSIONS_AUTRES courantes."""
+    return _compiler_regles(tuple(CATEGORIES.items()), tuple(EXCLUSIONS_AUTRES))
+
+
+def classer_libelles(libelles: pd.Series) -> pd.DataFrame:
+    """
+    Classe une colonne de libellés d'un coup.
+
+    Les libellés sont dédupliqués, passés une seule fois dans la regex
+    compilée (`str.extract`), puis les résultats sont rediffusés sur toutes
+    les lignes. Renvoie un DataFrame (Categorie, Mot_trouve, Traitee)
+    aligné sur l'index de `libelles`.
+    """
+    regex, groupes = compiler_regles()
+
+    codes, uniques = pd.factorize(libelles.astype("string").str.upper())
+    uniques = pd.Series(uniques, dtype="string")
+
+    trouves = uniques.str.extract(regex)[[groupe for groupe, _ in groupes]]
+    trouve = trouves.notna().to_numpy()
+    a_regle = trouve.any(axis=1)
+    premiere = trouve.argmax(axis=1)
+
+    # Sentinelle finale : les libellés manquants (code -1) → Autres, non traités
+    categories = np.array([categorie for _, categorie in groupes] + ["Autres"], dtype=object)
+    categorie_u = np.append(categories[np.where(a_regle, premiere, len(groupes))], "Autres")
+    mots = trouves.to_numpy(dtype=object)[np.arange(len(uniques)), premiere]
+    mot_u = np.append(np.where(a_regle, mots, None), None)
+    a_regle = np.append(a_regle, False)
+
+    return pd.DataFrame({
+        "Categorie": categorie_u[codes],
+        "Mot_trouve": mot_u[codes],
+        "Traitee": a_regle[codes],
+    }, index=libelles.index)
+
+
 def classer_depense(libelle):
     """Retourne (Categorie, Mot_trouvé, Traitee)"""
     if pd.isna(libelle):
         return "Autres", None, False
 
-    lib = str(libelle).upper()
-
-    # Cas exclus → Autres mais marquées comme traitées
-    for mot in EXCLUSIONS_AUTRES:
-        if mot in lib:
-            return "Autres", mot, True
-
-    # Cas catégorisés via REGEX
-    for pattern, categorie in CATEGORIES.items():
-        match = re.search(pattern, lib)
-        if match:
-            return categorie, match.group(0), True
-
-    # Cas restants → Autres non encore traités
-    return "Autres", None, False
+    resultat = classer_libelles(pd.Series([libelle])).iloc[0]
+    return resultat["Categorie"], resultat["Mot_trouve"], bool(resultat["Traitee"])
 
 
 def appliquer_regex(df: pd.DataFrame) -> pd.DataFrame:
     """Applique la classification regex sur un DataFrame d'opérations."""
     df = df.copy()
-    df[["Categorie", "Mot_trouve", "Traitee"]] = df.apply(
-        lambda row: pd.Series(classer_depense(row["Libellé"]))
-        if not pd.isna(row.get("Débit euros"))
-        else pd.Series(["Autres", None, False]),
-        axis=1,
-    )
+    resultats = classer_libelles(df["Libellé"])
+
+    # Opérations sans débit → Autres non traitées
+    if "Débit euros" in df.columns:
+        sans_debit = df["Débit euros"].isna()
+    else:
+        sans_debit = pd.Series(True, index=df.index)
+    resultats.loc[sans_debit, ["Categorie", "Mot_trouve", "Traitee"]] = ["Autres", None, False]
+
+    df[["Categorie", "Mot_trouve", "Traitee"]] = resultats
     print("✅ Classification REGEX appliquée.")
     return df
 
@@ -76,45 +130,207 @@ def appliquer_regex(df: pd.DataFrame) -> pd.DataFrame:
 # -----------------------------
 # 2️⃣ Fonction de classification par similarité (fuzzy)
 # -----------------------------
-def appliquer_fuzzy(df: pd.DataFrame, seuil: int = 90) -> pd.DataFrame:
+MEMOIRE_BLOC_FUZZY = 64 * 1024 * 1024  # octets max pour une matrice de scores
+
+# "fuzzy" : token_sort_ratio (rapidfuzz) ; "ngrammes" : index TF-IDF creux (scripts.index_ngrammes)
+METHODES_FUZZY = ("fuzzy", "ngrammes")
+
+
+def rechercher_correspondances(
+    requetes,
+    libelles_traites,
+    seuil: int = 90,
+    batch: bool = True,
+    taille_bloc: int | None = None,
+    workers: int = -1,
+) -> pd.DataFrame:
+    """
+    Cherche pour chaque libellé non traité le libellé traité le plus proche
+    (`fuzz.token_sort_ratio`) et renvoie les correspondances de score ≥ seuil :
+    (Libelle_non_traite, Libelle_traite_similaire, Score).
+
+    Les requêtes sont dédupliquées. En mode batch, elles sont scorées par blocs
+    avec `process.cdist` sur tous les cœurs (`workers=-1`) ; la taille des blocs
+    est bornée par MEMOIRE_BLOC_FUZZY si elle n'est pas fournie.
+    Sinon, repli sur un `process.extractOne` par libellé.
+    """
+    # Import à l'appel : rapidfuzz n'est chargé que si le fuzzy tourne
+    from rapidfuzz import fuzz, process
+
+    colonnes = ["Libelle_non_traite", "Libelle_traite_similaire", "Score"]
+    requetes = pd.Series(requetes, dtype=object).dropna().unique()
+    choix = pd.Series(libelles_traites, dtype=object).dropna().unique()
+
+    if len(requetes) == 0 or len(choix) == 0:
+        return pd.DataFrame(columns=colonnes)
+
+    if not batch:
+        matches = []
+        for lib in requetes:
+            match = process.extractOne(lib, choix, scorer=fuzz.token_sort_ratio, score_cutoff=seuil)
+            if match:
+                match_lib, score, idx = match
+                matches.append((lib, match_lib, score))
+        return pd.DataFrame(matches, columns=colonnes)
+
+    if taille_bloc is None:
+        taille_bloc = max(1, MEMOIRE_BLOC_FUZZY // (4 * len(choix)))
+
+    blocs = []
+    for debut in range(0, len(requetes), taille_bloc):
+        bloc = requetes[debut:debut + taille_bloc]
+        scores = process.cdist(
+            bloc, choix,
+            scorer=fuzz.token_sort_ratio,
+            score_cutoff=seuil,
+            dtype=np.float32,
+            workers=workers,
+        )
+        meilleurs = scores.argmax(axis=1)
+        meilleurs_scores = scores[np.arange(len(bloc)), meilleurs]
+        garde = meilleurs_scores >= seuil
+        blocs.append(pd.DataFrame({
+            "Libelle_non_traite": bloc[garde],
+            "Libelle_traite_similaire": choix[meilleurs[garde]],
+            "Score": meilleurs_scores[garde].astype(float),
+        }))
+
+    return pd.concat(blocs, ignore_index=True)
+
+
+def categories_par_libelle(df_traitees: pd.DataFrame) -> pd.Series:
+    """
+    Catégorie de référence de chaque libellé traité (Série indexée par libellé).
+    Un libellé rangé dans plusieurs catégories prend la plus fréquente,
+    les ex-aequo étant départagés par ordre alphabétique. Une colonne `n`
+    optionnelle donne le nombre d'occurrences de lignes déjà agrégées.
+    """
+    if "n" in df_traitees.columns:
+        poids = df_traitees["n"].fillna(1)
+    else:
+        poids = pd.Series(1, index=df_traitees.index)
+    comptes = (
+        poids.groupby([df_traitees["Libellé"], df_traitees["Categorie"]]).sum()
+        .reset_index(name="n")
+        .sort_values(["Libellé", "n", "Categorie"], ascending=[True, False, True])
+        .drop_duplicates("Libellé")
+    )
+    return comptes.set_index("Libellé")["Categorie"]
+
+
+def appliquer_suggestions(
+    df: pd.DataFrame,
+    df_suggestions: pd.DataFrame,
+    masque: pd.Series | None = None,
+    sous_chaine: bool = False,
+) -> pd.DataFrame:
+    """
+    Applique les suggestions (Libelle_non_traite → Categorie) aux lignes de `df`
+    sélectionnées par `masque` (toutes par défaut) et les marque traitées.
+
+    Par défaut, jointure exacte sur le libellé en une seule passe (`map`).
+    Avec `sous_chaine=True`, toute ligne dont le libellé contient un libellé
+    suggéré (sans tenir compte de la casse) reçoit sa catégorie ; si plusieurs
+    conviennent, la suggestion au meilleur score l'emporte.
+    """
+    if masque is None:
+        masque = pd.Series(True, index=df.index)
+    if df_suggestions.empty:
+        return df
+
+    suggestions = df_suggestions.dropna(subset=["Categorie"])
+    suggestions = suggestions.sort_values(
+        "Score", ascending=False, kind="stable"
+    ).drop_duplicates("Libelle_non_traite")
+    correspondance = suggestions.set_index("Libelle_non_traite")["Categorie"]
+
+    if not sous_chaine:
+        categories = df["Libellé"].map(correspondance)
+    else:
+        # Table de hachage libellé suggéré (minuscules) → rang par score décroissant :
+        # on y cherche chaque sous-chaîne des libellés, aux seules longueurs utiles
+        rangs_suggestions = {}
+        for rang, lib in enumerate(correspondance.index, start=1):
+            rangs_suggestions.setdefault(str(lib).lower(), rang)
+        longueurs = sorted({len(lib) for lib in rangs_suggestions})
+
+        def meilleur_rang(libelle):
+            texte = str(libelle).lower()
+            trouves = [
+                rangs_suggestions.get(texte[i:i + n], 0)
+                for n in longueurs
+                for i in range(len(texte) - n + 1)
+            ]
+            return min((r for r in trouves if r), default=0)
+
+        codes, uniques = pd.factorize(df["Libellé"])
+        rangs = np.array([meilleur_rang(lib) for lib in uniques] + [0])
+        valeurs = np.append(np.array([None], dtype=object), correspondance.to_numpy(dtype=object))
+        categories = pd.Series(valeurs[rangs[codes]], index=df.index)
+
+    cibles = categories.notna() & masque
+    df.loc[cibles, "Categorie"] = categories[cibles]
+    df.loc[cibles, "Traitee"] = True
+    return df
+
+
+def appliquer_fuzzy(
+    df: pd.DataFrame,
+    seuil: int = 90,
+    batch: bool = True,
+    taille_bloc: int | None = None,
+    sous_chaine: bool = False,
+    reference: pd.DataFrame | None = None,
+    methode: str = "fuzzy",
+    index=None,
+) -> pd.DataFrame:
+    """
+    Catégorise les opérations non traitées de `df` par similarité avec les
+    libellés déjà traités. `reference` (Libellé, Categorie[, n]) ajoute des
+    libellés traités venant d'ailleurs, p. ex. l'historique en base.
+    Avec `methode="ngrammes"`, la recherche passe par un `IndexNgrammes`
+    (`index` déjà construit, sinon construit sur les libellés traités).
+    """
+    if methode not in METHODES_FUZZY:
+        raise ValueError(f"❌ Méthode inconnue : {methode} (attendu : {', '.join(METHODES_FUZZY)})")
+
     print("\n🔍 Traitement des catégories par similarité (fuzzy)...")
 
     df["EstTraitee"] = (df["Categorie"] != "Autres") | (df["Traitee"] == True)
     df_traitees = df[df["EstTraitee"]].copy()
     df_a_traiter = df[~df["EstTraitee"]].copy()
 
+    if reference is not None and not reference.empty:
+        df_traitees = pd.concat([df_traitees, reference], ignore_index=True)
+
     print(f"🔹 {len(df_traitees)} opérations considérées comme traitées")
     print(f"🔸 {len(df_a_traiter)} opérations à traiter")
 
-    if df_a_traiter.empty or df_traitees.empty:
+    if df_a_traiter.empty or (df_traitees.empty and index is None):
         print("⚠️ Pas d'opérations à traiter par fuzzy matching.")
         return df
 
-    libelles_traitees = df_traitees["Libellé"].dropna().unique()
-    matches = []
-
-    for lib in df_a_traiter["Libellé"].dropna():
-        match = process.extractOne(lib, libelles_traitees, scorer=fuzz.token_sort_ratio)
-        if match:
-            match_lib, score, idx = match
-            matches.append((lib, match_lib, score))
-
-    df_matches = pd.DataFrame(matches, columns=["Libelle_non_traite", "Libelle_traite_similaire", "Score"])
-    df_matches = df_matches.merge(
-        df_traitees[["Libellé", "Categorie"]],
-        left_on="Libelle_traite_similaire",
-        right_on="Libellé",
-        how="left",
-    ).drop(columns=["Libellé"])
-
-    df_suggestions = df_matches[df_matches["Score"] >= seuil].sort_values(by="Score", ascending=False)
+    if methode == "ngrammes":
+        from scripts.index_ngrammes import IndexNgrammes
+
+        if index is None:
+            index = IndexNgrammes.construire(df_traitees)
+        df_suggestions = index.rechercher(df_a_traiter["Libellé"], seuil=seuil)
+    else:
+        df_matches = rechercher_correspondances(
+            df_a_traiter["Libellé"],
+            df_traitees["Libellé"],
+            seuil=seuil,
+            batch=batch,
+            taille_bloc=taille_bloc,
+        )
+        df_suggestions = df_matches.assign(
+            Categorie=df_matches["Libelle_traite_similaire"].map(categories_par_libelle(df_traitees))
+        )
 
     print(f"✅ {len(df_suggestions)} correspondances fortes trouvées (score ≥ {seuil})")
 
-    for _, row in df_suggestions.iterrows():
-        mask = df["Libellé"].str.contains(re.escape(row["Libelle_non_traite"]), case=False, na=False)
-        df.loc[mask, "Categorie"] = row["Categorie"]
-        df.loc[mask, "Traitee"] = True
+    df = appliquer_suggestions(df, df_suggestions, masque=~df["EstTraitee"], sous_chaine=sous_chaine)
 
     restantes = df[(df["Categorie"] == "Autres") & (df["Traitee"] != True) & (df["Débit euros"].notna())]
     print(f"📌 {len(restantes)} opérations restantes à catégoriser")
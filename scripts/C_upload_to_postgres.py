@@ -1,34 +1,36 @@
-from db import engine
-from sqlalchemy import text
+import sys
+
+from db import get_engine
+from scripts.A_traitement_donnees import traiter_fichier_bancaire
+from scripts.B_depenses import appliquer_fuzzy, appliquer_regex
+from scripts.dedoublonnage import ajouter_empreintes
+from scripts.ingestion import recharger_operations
+from scripts.schema import appliquer_migrations
 
 # -----------------------------
 # Script qui envoie les données vers PostgreSQL
 # -----------------------------
+#   python -m scripts.C_upload_to_postgres releve.xlsx
+# Le relevé est classé (regex puis fuzzy) et remplace le contenu de operations.
+
+
+def envoyer_operations(df, engine) -> int:
+    print("🔄 Envoi des données vers PostgreSQL...")
+    print("Connexion utilisée :", engine)
+
+    # ✅ Forcer un index propre pour générer la colonne 'id'
+    df = df.reset_index(drop=True)
+
+    # ✅ Table typée créée / mise à jour par les migrations (colonne Traitee comprise),
+    # puis contenu remplacé avec index comme colonne 'id'
+    with engine.begin() as conn:
+        appliquer_migrations(conn)
+        nb_lignes = recharger_operations(conn, ajouter_empreintes(df).rename_axis("id").reset_index())
+
+    print("✅ Données envoyées dans PostgreSQL avec colonne id + Traitee")
+    return nb_lignes
+
 
-print("🔄 Envoi des données vers PostgreSQL...")
-print("Connexion utilisée :", engine)
-
-# ✅ Forcer un index propre pour générer la colonne 'id'
-df = df.reset_index(drop=True)
-
-# ✅ Forcer la suppression de l'ancienne table
-with engine.begin() as conn:
-    conn.execute(text("DROP TABLE IF EXISTS operations;"))
-
-# ✅ Envoi du DataFrame avec index comme colonne 'id'
-df.to_sql(
-    "operations",
-    engine,
-    if_exists="replace",
-    index=True,
-    index_label="id"
-)
-
-# ✅ Ajouter la colonne Traitee si elle n'existe pas déjà
-with engine.begin() as conn:
-    conn.execute(text("""
-        ALTER TABLE operations_old
-        ADD COLUMN IF NOT EXISTS "Traitee" BOOLEAN DEFAULT FALSE;
-    """))
-
-print("✅ Données envoyées dans PostgreSQL avec colonne id + Traitee")
+if __name__ == "__main__":
+    df = appliquer_fuzzy(appliquer_regex(traiter_fichier_bancaire(sys.argv[1])))
+    envoyer_operations(df, get_engine())
@@ -1,25 +1,31 @@
-from db import engine
-from scripts.B_depenses import df
-from sqlalchemy import text
+import sys
+
+from db import get_engine
+from scripts.A_traitement_donnees import traiter_fichier_bancaire
+from scripts.B_depenses import appliquer_regex
+from scripts.dedoublonnage import ajouter_empreintes
+from scripts.ingestion import recharger_operations
+from scripts.schema import appliquer_migrations
 
 # -----------------------------
 # Ancien script qui envoyait vers sqlite
 # -----------------------------
+#   python -m scripts.Cbis_database releve.xlsx   (regex seule, sans fuzzy)
+
+
+def recharger_base(df, engine) -> int:
+    # ✅ Assure-toi d'avoir un index propre
+    df = df.reset_index(drop=True)
 
-# ✅ Assure-toi d'avoir un index propre
-df = df.reset_index(drop=True)
+    print(engine)  # Debug
 
-print(engine)  # Debug
+    with engine.begin() as conn:
+        appliquer_migrations(conn)
+        nb_lignes = recharger_operations(conn, ajouter_empreintes(df).rename_axis("id").reset_index())
 
-with engine.begin() as conn:
-    conn.execute(text("DROP TABLE IF EXISTS operations;"))
+    print("✅ Table rechargée + upload terminé")
+    return nb_lignes
 
-df.to_sql(
-    "operations",
-    engine,
-    if_exists="replace",
-    index=True,
-    index_label="id"
-)
 
-print("✅ Table recréée + upload terminé")
+if __name__ == "__main__":
+    recharger_base(appliquer_regex(traiter_fichier_bancaire(sys.argv[1])), get_engine())
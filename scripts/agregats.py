@@ -0,0 +1,116 @@
+# ======================================================
+# 📊 Agrégats mensuels (vues matérialisées PostgreSQL)
+# ======================================================
+# - operations_mensuelles : sommes et effectifs par (Mois, Compte, Categorie)
+# - revenus_mensuels      : épargne (virements internes) et salaires par
+#                           (Mois, Compte)
+# Rafraîchies par l'ingestion et la catégorisation, lues par les pages
+# à la place de la table operations. Hors ligne, `agreger` calcule les
+# mêmes tableaux en pandas à partir du snapshot Parquet.
+# ======================================================
+
+import pandas as pd
+from sqlalchemy import text
+
+# Virement interne entre comptes (même règle que la page Revenus)
+CONDITION_VIREMENT_INTERNE = """
+    UPPER("Libellé") LIKE '%VIREMENT%'
+    AND UPPER("Libellé") LIKE '%BARREAU%'
+    AND UPPER("Libellé") LIKE '%JOSEPH%'
+    AND UPPER("Libellé") NOT LIKE '%LOYER%'
+"""
+
+CONDITION_SALAIRE = """UPPER("Libellé") LIKE '%SALAIRE%'"""
+
+VUES = {
+    "operations_mensuelles": """
+        SELECT
+            CAST(date_trunc('month', "Date") AS DATE) AS "Mois",
+            "Compte",
+            "Categorie",
+            SUM("Débit euros") AS "Débit euros",
+            SUM("Crédit euros") AS "Crédit euros",
+            COUNT(*) AS nb_operations,
+            -- Débit à 0 (et non NULL) sur les crédits : seuls les montants positifs comptent
+            COUNT(*) FILTER (WHERE "Débit euros" > 0) AS nb_debits
+        FROM operations
+        GROUP BY 1, 2, 3
+    """,
+    "revenus_mensuels": f"""
+        SELECT
+            CAST(date_trunc('month', "Date") AS DATE) AS "Mois",
+            "Compte",
+            SUM("Débit euros") FILTER (WHERE {CONDITION_VIREMENT_INTERNE}) AS "Épargne",
+            COUNT(*) FILTER (WHERE {CONDITION_VIREMENT_INTERNE}) AS nb_virements,
+            SUM("Crédit euros") FILTER (WHERE {CONDITION_SALAIRE}) AS "Salaire"
+        FROM operations
+        GROUP BY 1, 2
+    """,
+}
+
+INDEX_VUES = {
+    "operations_mensuelles": '("Mois", "Compte", "Categorie")',
+    "revenus_mensuels": '("Mois", "Compte")',
+}
+
+
+def creer_agregats(conn) -> None:
+    """Crée les vues matérialisées (et leur index) si elles n'existent pas (migrations 004 et 011)."""
+    for nom, requete in VUES.items():
+        conn.execute(text(f"CREATE MATERIALIZED VIEW IF NOT EXISTS {nom} AS {requete};"))
+        conn.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS ux_{nom} ON {nom} {INDEX_VUES[nom]};"))
+
+
+def rafraichir_agregats(conn) -> None:
+    """
+    Rafraîchit les vues après une écriture dans operations (même transaction).
+    CONCURRENTLY (index unique ux_<vue>) : les pages continuent de lire les
+    vues pendant le rafraîchissement, seules les lignes modifiées sont réécrites.
+    """
+    for nom in VUES:
+        conn.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {nom};"))
+
+
+# -----------------------------
+# Mêmes agrégats en pandas (mode hors ligne, sur le snapshot Parquet)
+# -----------------------------
+def masque_virements_internes(libelles: pd.Series) -> pd.Series:
+    """Équivalent pandas de CONDITION_VIREMENT_INTERNE."""
+    libelles = libelles.fillna("").str.upper()
+    return (
+        libelles.str.contains("VIREMENT", regex=False)
+        & libelles.str.contains("BARREAU", regex=False)
+        & libelles.str.contains("JOSEPH", regex=False)
+        & ~libelles.str.contains("LOYER", regex=False)
+    )
+
+
+def masque_salaires(libelles: pd.Series) -> pd.Series:
+    """Équivalent pandas de CONDITION_SALAIRE."""
+    return libelles.fillna("").str.upper().str.contains("SALAIRE", regex=False)
+
+
+def agreger(df: pd.DataFrame, vue: str) -> pd.DataFrame:
+    """Calcule la vue `vue` à partir des lignes de operations (mêmes colonnes que la vue SQL)."""
+    df = df.assign(Mois=df["Date"].dt.to_period("M").dt.to_timestamp())
+
+    if vue == "operations_mensuelles":
+        df = df.assign(nb_debits=df["Débit euros"] > 0)
+        groupes = df.groupby(["Mois", "Compte", "Categorie"], dropna=False)
+        resultat = groupes[["Débit euros", "Crédit euros"]].sum(min_count=1)
+        resultat["nb_operations"] = groupes.size()
+        resultat["nb_debits"] = groupes["nb_debits"].sum()
+    elif vue == "revenus_mensuels":
+        virements = masque_virements_internes(df["Libellé"])
+        df = df.assign(
+            **{"Épargne": df["Débit euros"].where(virements), "Salaire": df["Crédit euros"].where(masque_salaires(df["Libellé"]))},
+            nb_virements=virements,
+        )
+        groupes = df.groupby(["Mois", "Compte"], dropna=False)
+        resultat = groupes[["Épargne"]].sum(min_count=1)
+        resultat["nb_virements"] = groupes["nb_virements"].sum()
+        resultat["Salaire"] = groupes["Salaire"].sum(min_count=1)
+    else:
+        raise ValueError(f"❌ Vue inconnue : {vue}")
+
+    return resultat.reset_index()
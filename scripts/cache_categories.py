@@ -0,0 +1,247 @@
+# ======================================================
+# 🧠 Cache libellé → catégorie
+# ======================================================
+# Les commerçants reviennent tous les mois : un libellé déjà catégorisé
+# (par regex, fuzzy ou à la main) est mémorisé dans la table
+# label_categories et dans un LRU en mémoire. Un libellé trouvé dans le
+# cache ne passe plus ni par la regex ni par le fuzzy.
+#
+# - les entrées "regex" et "fuzzy" portent la signature des règles
+#   (CATEGORIES + EXCLUSIONS_AUTRES) : modifier les règles les invalide
+# - les entrées "manuel" (formulaire Dépenses) restent valables et ne sont
+#   jamais écrasées par un classement automatique
+# ======================================================
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+from sqlalchemy import text
+
+from db import copier_dataframe, incrementer_version, lire_version
+from scripts.B_depenses import CATEGORIES, EXCLUSIONS_AUTRES, appliquer_regex
+from scripts.instrumentation import etape
+from scripts.schema import appliquer_migrations
+
+TABLE_CACHE = "label_categories"
+TAILLE_LRU = 50_000
+# Entrées automatiques non revues depuis ce délai supprimées par purger_cache
+JOURS_RETENTION = 730
+# vu_le d'une entrée relue n'est réécrit que s'il date de plus de ce délai
+JOURS_RAFRAICHISSEMENT = 30
+# Purge au plus une fois par intervalle et par processus (ou si les règles changent)
+INTERVALLE_PURGE_S = 24 * 3600
+
+COLONNES_RESULTAT = ["Categorie", "Mot_trouve", "Traitee"]
+
+# LRU en mémoire : (signature, libellé) → (Categorie, Mot_trouve, Traitee)
+_lru = OrderedDict()
+_version_lru = None
+# Intégrations simultanées (threads de scripts/taches.py) : un LRU partagé
+_verrou_lru = threading.RLock()
+# Dernière purge de ce processus : (instant time.monotonic(), signature des règles)
+_derniere_purge = None
+
+
+def signature_regles() -> str:
+    """Empreinte des règles de classement courantes."""
+    regles = repr((tuple(CATEGORIES.items()), tuple(EXCLUSIONS_AUTRES)))
+    return hashlib.sha1(regles.encode("utf-8")).hexdigest()[:16]
+
+
+def vider_lru() -> None:
+    global _version_lru
+    with _verrou_lru:
+        _lru.clear()
+        _version_lru = None
+
+
+def _synchroniser_lru(conn) -> None:
+    """Vide le LRU si la table a été modifiée par un autre processus."""
+    global _version_lru
+    version = lire_version(conn, TABLE_CACHE)
+    with _verrou_lru:
+        if version != _version_lru:
+            _lru.clear()
+            _version_lru = version
+
+
+def _garder(signature: str, libelle: str, resultat: tuple) -> None:
+    with _verrou_lru:
+        _lru[(signature, libelle)] = resultat
+        _lru.move_to_end((signature, libelle))
+        while len(_lru) > TAILLE_LRU:
+            _lru.popitem(last=False)
+
+
+def lire_cache(conn, libelles) -> pd.DataFrame:
+    """
+    Résultats mémorisés pour `libelles` : DataFrame (Categorie, Mot_trouve,
+    Traitee) indexé par libellé, limité aux libellés trouvés.
+    Le LRU répond d'abord, la table pour le reste. Lecture seule : vu_le
+    est mis à jour par `marquer_vus`.
+    """
+    signature = signature_regles()
+    _synchroniser_lru(conn)
+
+    trouves = {}
+    manquants = []
+    with _verrou_lru:
+        for libelle in pd.unique(pd.Series(libelles).dropna()):
+            resultat = _lru.get((signature, libelle))
+            if resultat is None:
+                manquants.append(libelle)
+            else:
+                _lru.move_to_end((signature, libelle))
+                trouves[libelle] = resultat
+
+    if manquants:
+        lignes = conn.execute(text(f"""
+            SELECT libelle, categorie, mot_trouve, traitee
+            FROM {TABLE_CACHE}
+            WHERE libelle = ANY(:libelles) AND (source = 'manuel' OR signature = :signature);
+        """), {"libelles": manquants, "signature": signature}).all()
+        for libelle, categorie, mot_trouve, traitee in lignes:
+            trouves[libelle] = (categorie, mot_trouve, traitee)
+            _garder(signature, libelle, trouves[libelle])
+
+    return pd.DataFrame.from_dict(trouves, orient="index", columns=COLONNES_RESULTAT)
+
+
+def marquer_vus(conn, libelles) -> int:
+    """
+    Date de dernière lecture (vu_le) des entrées `libelles`, en une requête
+    pour tout un relevé. Seules les entrées non revues depuis
+    JOURS_RAFRAICHISSEMENT sont réécrites : un libellé mensuel l'est une
+    fois par mois, pas à chaque relevé. Renvoie le nombre d'entrées mises à jour.
+    """
+    libelles = list(pd.unique(pd.Series(libelles).dropna()))
+    if not libelles:
+        return 0
+    resultat = conn.execute(text(f"""
+        UPDATE {TABLE_CACHE}
+        SET vu_le = now()
+        WHERE libelle = ANY(:libelles) AND vu_le < now() - make_interval(days => :jours);
+    """), {"libelles": libelles, "jours": JOURS_RAFRAICHISSEMENT})
+    return resultat.rowcount
+
+
+def memoriser(conn, df: pd.DataFrame, source: str) -> int:
+    """
+    Mémorise le résultat (Categorie, Mot_trouve, Traitee) des libellés de `df`
+    (une ligne par libellé conservée). Une entrée "manuel" n'est remplacée que
+    par une autre entrée "manuel". Renvoie le nombre d'entrées écrites.
+    """
+    entrees = (
+        df.dropna(subset=["Libellé"])
+        .drop_duplicates("Libellé", keep="last")
+        .reindex(columns=["Libellé"] + COLONNES_RESULTAT)
+        .rename(columns={
+            "Libellé": "libelle", "Categorie": "categorie",
+            "Mot_trouve": "mot_trouve", "Traitee": "traitee",
+        })
+    )
+    if entrees.empty:
+        return 0
+    entrees["traitee"] = entrees["traitee"].eq(True)
+
+    # Table de travail temporaire : un formulaire et une intégration simultanés ne se gênent pas
+    copier_dataframe(entrees, "label_categories_staging", conn, temporaire=True)
+    resultat = conn.execute(text(f"""
+        INSERT INTO {TABLE_CACHE} AS c (libelle, categorie, mot_trouve, traitee, source, signature)
+        SELECT libelle, categorie, mot_trouve, traitee, :source, :signature
+        FROM label_categories_staging
+        ORDER BY libelle  -- même ordre de verrouillage pour deux écritures simultanées
+        ON CONFLICT (libelle) DO UPDATE
+        SET categorie = EXCLUDED.categorie,
+            mot_trouve = EXCLUDED.mot_trouve,
+            traitee = EXCLUDED.traitee,
+            source = EXCLUDED.source,
+            signature = EXCLUDED.signature,
+            vu_le = now()
+        WHERE c.source <> 'manuel' OR EXCLUDED.source = 'manuel';
+    """), {"source": source, "signature": signature_regles()})
+
+    if resultat.rowcount:
+        incrementer_version(conn, TABLE_CACHE)
+    return resultat.rowcount
+
+
+def memoriser_operations(conn, ids) -> int:
+    """
+    Mémorise comme choix manuels les catégories actuelles des opérations `ids`.
+    "Autres" n'est pas mémorisé : les prochaines opérations du même libellé
+    repassent par la file à catégoriser.
+    """
+    df = pd.read_sql(text("""
+        SELECT "Libellé", "Categorie", "Mot_trouve", "Traitee"
+        FROM operations
+        WHERE id = ANY(:ids) AND "Categorie" <> 'Autres'
+        ORDER BY id;
+    """), conn, params={"ids": [int(i) for i in ids]})
+    return memoriser(conn, df, "manuel")
+
+
+def purger_cache(conn) -> int:
+    """Supprime les entrées automatiques périmées (règles modifiées ou libellé plus vu)."""
+    resultat = conn.execute(text(f"""
+        DELETE FROM {TABLE_CACHE}
+        WHERE source <> 'manuel'
+          AND (signature <> :signature OR vu_le < now() - make_interval(days => :jours));
+    """), {"signature": signature_regles(), "jours": JOURS_RETENTION})
+    if resultat.rowcount:
+        incrementer_version(conn, TABLE_CACHE)
+    return resultat.rowcount
+
+
+def purger_si_necessaire(conn) -> int:
+    """
+    `purger_cache` si ce processus n'a pas purgé depuis INTERVALLE_PURGE_S
+    ou si les règles ont changé depuis sa dernière purge ; sinon rien.
+    Renvoie le nombre d'entrées supprimées.
+    """
+    global _derniere_purge
+    signature = signature_regles()
+    if _derniere_purge is not None:
+        instant, signature_purge = _derniere_purge
+        if signature_purge == signature and time.monotonic() - instant < INTERVALLE_PURGE_S:
+            return 0
+    nb = purger_cache(conn)
+    _derniere_purge = (time.monotonic(), signature)
+    return nb
+
+
+def classer_avec_cache(df: pd.DataFrame, engine) -> pd.DataFrame:
+    """
+    Équivalent de `appliquer_regex` qui consulte d'abord le cache : les
+    libellés connus reprennent leur catégorie, seuls les autres passent par
+    la regex, dont les résultats trouvés sont mémorisés.
+    Les lignes trouvées dans le cache sont traitées : le fuzzy les ignore.
+    """
+    with etape("regex", lignes=len(df)):
+        df = df.copy()
+        if "Débit euros" in df.columns:
+            avec_debit = df["Débit euros"].notna()
+        else:
+            avec_debit = pd.Series(False, index=df.index)
+
+        with engine.begin() as conn:
+            appliquer_migrations(conn)
+            purger_si_necessaire(conn)
+            connus = lire_cache(conn, df.loc[avec_debit, "Libellé"])
+            marquer_vus(conn, connus.index)
+
+            en_cache = avec_debit & df["Libellé"].isin(connus.index)
+            df_regex = appliquer_regex(df[~en_cache])
+            memoriser(conn, df_regex[df_regex["Traitee"] == True], "regex")
+
+        print(f"🧠 {int(en_cache.sum())} opérations classées par le cache ({len(connus)} libellés connus)")
+
+        df[COLONNES_RESULTAT] = None
+        df.loc[~en_cache, COLONNES_RESULTAT] = df_regex[COLONNES_RESULTAT]
+        if en_cache.any():
+            df.loc[en_cache, COLONNES_RESULTAT] = connus.loc[df.loc[en_cache, "Libellé"], COLONNES_RESULTAT].to_numpy()
+        df["Traitee"] = df["Traitee"].astype(bool)
+        return df
@@ -0,0 +1,101 @@
+# ======================================================
+# 🧬 Empreintes des opérations (dédoublonnage)
+# ======================================================
+# Chaque opération reçoit une empreinte stable, calculée à partir de :
+#   compte | date | libellé normalisé | montant en centimes | occurrence
+# "Occurrence" numérote les lignes identiques d'un même relevé (deux cafés
+# le même jour au même prix) pour les conserver. Un relevé couvrant des
+# journées entières, une opération présente dans deux relevés qui se
+# chevauchent a la même empreinte, quelle que soit la largeur du
+# recouvrement.
+#
+# L'empreinte est stockée dans operations."Empreinte" (index unique) :
+# une opération déjà connue se repère par recherche dans l'index, sans
+# relire la table.
+# ======================================================
+
+import hashlib
+
+import pandas as pd
+from sqlalchemy import text
+
+from db import copier_dataframe
+
+# Composantes de l'empreinte ("Libellé" normalisé, "Montant" en centimes)
+CLE_EMPREINTE = ["Compte", "Date", "Libellé", "Montant", "Occurrence"]
+
+
+def normaliser_libelle(libelles: pd.Series) -> pd.Series:
+    """Libellés en majuscules, espaces multiples réduits à un seul, sans espace aux bords."""
+    return (
+        libelles.astype("string").fillna("")
+        .str.replace(r"\s+", " ", regex=True)
+        .str.strip()
+        .str.upper()
+    )
+
+
+def _composantes(df: pd.DataFrame) -> dict[str, pd.Series]:
+    return {
+        "Compte": df["Compte"].astype("int64").astype(str),
+        "Date": pd.to_datetime(df["Date"]).dt.strftime("%Y-%m-%d"),
+        "Libellé": normaliser_libelle(df["Libellé"]),
+        "Montant": (df["Montant"].astype(float) * 100).round().astype("int64").astype(str),
+    }
+
+
+def ajouter_empreintes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Numérote (0, 1, ...) les opérations identiques de `df` dans l'ordre des
+    lignes ("Occurrence") et calcule leur "Empreinte" (hachage BLAKE2b
+    128 bits, en hexadécimal). `df` est un relevé entier, ou toute la table.
+    """
+    df = df.copy()
+    composantes = _composantes(df)
+    df["Occurrence"] = pd.DataFrame(composantes).groupby(list(composantes), sort=False).cumcount()
+
+    cles = composantes["Compte"].str.cat(
+        [composantes["Date"], composantes["Libellé"], composantes["Montant"], df["Occurrence"].astype(str)],
+        sep="|",
+    )
+    df["Empreinte"] = [hashlib.blake2b(cle.encode(), digest_size=16).hexdigest() for cle in cles]
+    return df
+
+
+def empreintes_connues(conn, empreintes) -> set[str]:
+    """Empreintes de `empreintes` déjà présentes dans operations (recherches dans l'index unique)."""
+    empreintes = list(dict.fromkeys(empreintes))
+    if not empreintes:
+        return set()
+    return set(conn.execute(text("""
+        SELECT "Empreinte" FROM operations WHERE "Empreinte" = ANY(CAST(:empreintes AS TEXT[]))
+    """), {"empreintes": empreintes}).scalars())
+
+
+def recalculer_empreintes(conn) -> int:
+    """
+    Recalcule "Occurrence" et "Empreinte" de toute la table (ordre des id),
+    p. ex. pour l'historique écrit avant l'ajout de l'empreinte.
+    N'écrit que les lignes modifiées ; renvoie leur nombre.
+    """
+    df = pd.read_sql(text("""
+        SELECT id, "Compte", "Date", "Libellé", "Montant", "Occurrence", "Empreinte"
+        FROM operations
+        ORDER BY id;
+    """), conn)
+    if df.empty:
+        return 0
+    df = df.rename(columns={"Occurrence": "ancienne_occurrence", "Empreinte": "ancienne_empreinte"})
+    df = ajouter_empreintes(df)
+    modifiees = df[
+        df["Empreinte"].ne(df["ancienne_empreinte"]) | df["Occurrence"].ne(df["ancienne_occurrence"])
+    ]
+
+    copier_dataframe(modifiees[["id", "Occurrence", "Empreinte"]], "empreintes_staging", conn, temporaire=True)
+    resultat = conn.execute(text("""
+        UPDATE operations o
+        SET "Occurrence" = s."Occurrence", "Empreinte" = s."Empreinte"
+        FROM empreintes_staging s
+        WHERE o.id = s.id;
+    """))
+    return resultat.rowcount
@@ -0,0 +1,190 @@
+# ======================================================
+# 🔎 Classification par n-grammes (plus proches voisins)
+# ======================================================
+# Alternative au fuzzy matching de B_depenses : les libellés traités sont
+# découpés en n-grammes de caractères, pondérés TF-IDF et rangés dans une
+# matrice creuse (une ligne par libellé). Tous les libellés à traiter sont
+# comparés d'un coup par produit matriciel creux (similarité cosinus) : seuls
+# les libellés partageant des n-grammes avec la requête sont visités.
+#
+# L'index se sauvegarde (.npz) pour être construit une fois et réutilisé.
+# ======================================================
+
+import re
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from scripts.B_depenses import categories_par_libelle
+
+TAILLE_NGRAMME = 3
+TAILLE_BLOC_NGRAMMES = 2048  # requêtes comparées par produit matriciel
+# N-grammes présents dans plus de cette part des libellés ("CB ", " PRL") écartés
+# du vocabulaire : ils ne distinguent rien et rendraient le produit quasi dense
+FREQUENCE_MAX_NGRAMME = 0.1
+# ... mais jamais un n-gramme présent dans au plus ce nombre de libellés : un
+# petit index (nouvel utilisateur) garde tout son vocabulaire
+NB_LIBELLES_MIN_ELAGAGE = 50
+
+
+def normaliser(libelle) -> str:
+    """Majuscules et espaces simples, bornée par des espaces (début / fin de mot)."""
+    return " " + re.sub(r"\s+", " ", str(libelle).upper()).strip() + " "
+
+
+def ngrammes(libelle, n: int = TAILLE_NGRAMME) -> list[str]:
+    texte = normaliser(libelle)
+    return [texte[i:i + n] for i in range(max(1, len(texte) - n + 1))]
+
+
+def _normaliser_lignes(matrice: sparse.csr_matrix) -> sparse.csr_matrix:
+    normes = np.sqrt(np.asarray(matrice.multiply(matrice).sum(axis=1)).ravel())
+    normes[normes == 0] = 1
+    return sparse.diags(1 / normes) @ matrice
+
+
+def _meilleur_par_ligne(scores: sparse.csr_matrix) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Colonne et valeur du maximum de chaque ligne, calculés directement sur
+    les tableaux CSR (sans le tri d'indices de `csr_matrix.argmax`).
+    Lignes vides : colonne 0, valeur 0.
+    """
+    colonnes = np.zeros(scores.shape[0], dtype=np.int64)
+    valeurs = np.zeros(scores.shape[0], dtype=np.float32)
+    tailles = np.diff(scores.indptr)
+    non_vides = np.flatnonzero(tailles)
+    if len(non_vides) == 0:
+        return colonnes, valeurs
+
+    maxima = np.maximum.reduceat(scores.data, scores.indptr[non_vides])
+    lignes = np.repeat(non_vides, tailles[non_vides])
+    positions = np.flatnonzero(scores.data == np.repeat(maxima, tailles[non_vides]))
+    # Première position du maximum dans chaque ligne
+    lignes_max, premieres = np.unique(lignes[positions], return_index=True)
+    colonnes[lignes_max] = scores.indices[positions[premieres]]
+    valeurs[non_vides] = maxima
+    return colonnes, valeurs
+
+
+class IndexNgrammes:
+    """
+    Index TF-IDF des n-grammes des libellés traités, avec la catégorie de
+    référence de chaque libellé (`categories_par_libelle`).
+    """
+
+    def __init__(self, vocabulaire, idf, matrice, libelles, categories, n: int = TAILLE_NGRAMME):
+        self.vocabulaire = {g: j for j, g in enumerate(vocabulaire)}
+        self.idf = np.asarray(idf, dtype=np.float32)
+        self.matrice = sparse.csr_matrix(matrice, dtype=np.float32)
+        self.libelles = np.asarray(libelles, dtype=object)
+        self.categories = np.asarray(categories, dtype=object)
+        self.n = n
+
+    @classmethod
+    def construire(
+        cls,
+        df_traitees: pd.DataFrame,
+        n: int = TAILLE_NGRAMME,
+        frequence_max: float = FREQUENCE_MAX_NGRAMME,
+    ) -> "IndexNgrammes":
+        """Construit l'index à partir des opérations traitées (Libellé, Categorie[, n])."""
+        reference = categories_par_libelle(df_traitees.dropna(subset=["Libellé", "Categorie"]))
+        vocabulaire = {}
+        lignes, colonnes = [], []
+        for i, libelle in enumerate(reference.index):
+            for g in ngrammes(libelle, n):
+                lignes.append(i)
+                colonnes.append(vocabulaire.setdefault(g, len(vocabulaire)))
+
+        comptes = sparse.csr_matrix(
+            (np.ones(len(lignes), dtype=np.float32), (lignes, colonnes)),
+            shape=(len(reference), len(vocabulaire)),
+        )
+        comptes.sum_duplicates()
+
+        # Vocabulaire restreint aux n-grammes assez rares, puis idf lissé
+        frequences = np.bincount(comptes.indices, minlength=len(vocabulaire))
+        gardes = np.flatnonzero(frequences <= max(NB_LIBELLES_MIN_ELAGAGE, frequence_max * len(reference)))
+        comptes = comptes[:, gardes].tocsr()
+        idf = np.log((1 + len(reference)) / (1 + frequences[gardes])) + 1
+
+        termes = np.array(list(vocabulaire), dtype=object)[gardes]
+        index = cls(termes, idf, comptes, reference.index, reference.to_numpy(), n)
+        index.matrice = index._ponderer(comptes)
+        return index
+
+    def _ponderer(self, comptes: sparse.csr_matrix) -> sparse.csr_matrix:
+        """TF logarithmique × IDF, lignes normalisées (norme L2 = 1)."""
+        poids = comptes.astype(np.float32)
+        poids.data = (1 + np.log(poids.data)) * self.idf[poids.indices]
+        return _normaliser_lignes(poids).tocsr()
+
+    def vectoriser(self, libelles) -> sparse.csr_matrix:
+        """Vecteurs TF-IDF de `libelles` (les n-grammes inconnus de l'index sont ignorés)."""
+        lignes, colonnes = [], []
+        for i, libelle in enumerate(libelles):
+            for g in ngrammes(libelle, self.n):
+                j = self.vocabulaire.get(g)
+                if j is not None:
+                    lignes.append(i)
+                    colonnes.append(j)
+
+        comptes = sparse.csr_matrix(
+            (np.ones(len(lignes), dtype=np.float32), (lignes, colonnes)),
+            shape=(len(libelles), len(self.vocabulaire)),
+        )
+        comptes.sum_duplicates()
+        return self._ponderer(comptes)
+
+    def rechercher(self, requetes, seuil: int = 90, taille_bloc: int = TAILLE_BLOC_NGRAMMES) -> pd.DataFrame:
+        """
+        Plus proche libellé traité de chaque requête (dédupliquée) et sa catégorie.
+        Le score est la similarité cosinus sur 0–100 ; comme pour le fuzzy, seules
+        les correspondances de score ≥ seuil sont renvoyées :
+        (Libelle_non_traite, Libelle_traite_similaire, Categorie, Score).
+        """
+        colonnes = ["Libelle_non_traite", "Libelle_traite_similaire", "Categorie", "Score"]
+        requetes = pd.Series(requetes, dtype=object).dropna().unique()
+        if len(requetes) == 0 or len(self.libelles) == 0:
+            return pd.DataFrame(columns=colonnes)
+
+        transposee = self.matrice.T.tocsc()
+        blocs = []
+        for debut in range(0, len(requetes), taille_bloc):
+            bloc = requetes[debut:debut + taille_bloc]
+            meilleurs, meilleurs_scores = _meilleur_par_ligne((self.vectoriser(bloc) @ transposee).tocsr())
+            meilleurs_scores = meilleurs_scores * 100
+            garde = meilleurs_scores >= seuil
+            blocs.append(pd.DataFrame({
+                "Libelle_non_traite": bloc[garde],
+                "Libelle_traite_similaire": self.libelles[meilleurs[garde]],
+                "Categorie": self.categories[meilleurs[garde]],
+                "Score": meilleurs_scores[garde].astype(float),
+            }))
+
+        return pd.concat(blocs, ignore_index=True)
+
+    # -----------------------------
+    # Sauvegarde
+    # -----------------------------
+    def sauvegarder(self, chemin: str) -> None:
+        """Écrit l'index dans un fichier .npz (sans pickle)."""
+        np.savez_compressed(
+            chemin,
+            n=self.n,
+            vocabulaire=np.array(list(self.vocabulaire), dtype=str),
+            idf=self.idf,
+            data=self.matrice.data,
+            indices=self.matrice.indices,
+            indptr=self.matrice.indptr,
+            forme=np.array(self.matrice.shape),
+            libelles=self.libelles.astype(str),
+            categories=self.categories.astype(str),
+        )
+
+    @classmethod
+    def charger(cls, chemin: str) -> "IndexNgrammes":
+        with np.load(chemin, allow_pickle=False) as f:
+            matrice = sparse.csr_matrix((f["data"], f["indices"], f["indptr"]), shape=tuple(f["forme"]))
+            return cls(f["vocabulaire"], f["idf"], matrice, f["libelles"], f["categories"], int(f["n"]))
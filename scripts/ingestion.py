@@ -0,0 +1,258 @@
+# ======================================================
+# 📥 Intégration d'un relevé dans la table operations
+# ======================================================
+# Deux modes :
+# - "incremental"    : insère uniquement les nouvelles opérations dans la
+#                      table existante (empreintes cherchées dans l'index
+#                      unique, ON CONFLICT DO NOTHING), les ids existants
+#                      ne bougent pas
+# - "reconstruction" : relit toute la table, fusionne, dédoublonne sur les
+#                      empreintes puis recharge la table (sauvegarde
+#                      operations_old)
+# ======================================================
+
+import pandas as pd
+from sqlalchemy import text
+
+from db import copier_dataframe, incrementer_version
+from scripts.A_traitement_donnees import calculer_solde_courant
+from scripts.B_depenses import appliquer_fuzzy
+from scripts.agregats import rafraichir_agregats
+from scripts.cache_categories import TABLE_CACHE, memoriser, signature_regles
+from scripts.dedoublonnage import ajouter_empreintes, empreintes_connues
+from scripts.instrumentation import etape
+from scripts.snapshot import ecrire_snapshot, snapshot_a_jour
+from scripts.schema import appliquer_migrations, colonnes_table, recreer_index, supprimer_index_secondaires
+
+MODES = ("incremental", "reconstruction")
+
+
+def recharger_operations(conn, df: pd.DataFrame, differer_index: bool = False) -> int:
+    """
+    Remplace le contenu de operations par `df` (ids compris) sans recréer la
+    table : schéma, index et vues restent en place. L'ancien contenu est
+    sauvegardé dans operations_old. Avec `differer_index`, les index
+    secondaires sont reconstruits une fois la copie terminée.
+    Renvoie le nombre de lignes écrites.
+    """
+    colonnes = [c for c in df.columns if c in colonnes_table(conn, "operations")]
+    df = df[colonnes].assign(
+        Categorie=df["Categorie"].fillna("Autres"),
+        Traitee=df["Traitee"].eq(True),
+    )
+
+    with etape("ecriture", lignes=len(df)):
+        conn.execute(text("DROP TABLE IF EXISTS operations_old;"))
+        conn.execute(text("CREATE TABLE operations_old AS TABLE operations;"))
+        conn.execute(text("TRUNCATE operations;"))
+        index_supprimes = supprimer_index_secondaires(conn) if differer_index else []
+        copier_dataframe(df, "operations", conn)
+
+    with etape("bascule"):
+        recreer_index(conn, index_supprimes)
+        conn.execute(text("""
+            SELECT setval(pg_get_serial_sequence('operations', 'id'), COALESCE(MAX(id), 0) + 1, false)
+            FROM operations;
+        """))
+        rafraichir_agregats(conn)
+        incrementer_version(conn)
+    return len(df)
+
+
+def recalculer_soldes_courants(conn) -> int:
+    """
+    Recalcule le "Solde courant" de toute la table (même calcul que
+    `traiter_fichier_bancaire`, ancré sur le relevé le plus récent de chaque
+    compte) et n'écrit que les valeurs modifiées. Renvoie le nombre de lignes mises à jour.
+    """
+    df = pd.read_sql(text("""
+        SELECT id, "Compte", "Date", "Montant", "Solde final", "Date solde final"
+        FROM operations
+        ORDER BY "Compte", "Date", id;
+    """), conn)
+    df["Solde courant"] = calculer_solde_courant(df)
+
+    copier_dataframe(df[["id", "Solde courant"]], "soldes_staging", conn, temporaire=True)
+    resultat = conn.execute(text("""
+        UPDATE operations o
+        SET "Solde courant" = s."Solde courant"
+        FROM soldes_staging s
+        WHERE o.id = s.id AND o."Solde courant" IS DISTINCT FROM s."Solde courant";
+    """))
+    if resultat.rowcount:
+        incrementer_version(conn)
+    return resultat.rowcount
+
+
+def recalculer_soldes(engine, journal=print) -> int:
+    """`recalculer_soldes_courants` dans sa propre transaction (étape "soldes")."""
+    with etape("soldes") as mesure, engine.begin() as conn:
+        mesure["lignes"] = recalculer_soldes_courants(conn)
+    journal(f"🧮 {mesure['lignes']} soldes courants mis à jour")
+    return mesure["lignes"]
+
+
+def memoriser_fuzzy(conn, df_final: pd.DataFrame) -> int:
+    """Mémorise dans le cache les libellés catégorisés par le fuzzy (non traités avant lui)."""
+    if "EstTraitee" not in df_final.columns:
+        return 0
+    trouves = df_final[~df_final["EstTraitee"] & (df_final["Traitee"] == True)]
+    return memoriser(conn, trouves, "fuzzy")
+
+
+def lire_reference(conn) -> pd.DataFrame:
+    """
+    Libellés déjà traités (Libellé, Categorie), lus dans le cache libellé →
+    catégorie (une ligne par libellé, entrées valides) plutôt que dans tout
+    l'historique de operations : la taille de la référence suit le nombre de
+    libellés distincts, pas le nombre d'opérations.
+    """
+    return pd.read_sql(text(f"""
+        SELECT libelle AS "Libellé", categorie AS "Categorie"
+        FROM {TABLE_CACHE}
+        WHERE (categorie <> 'Autres' OR traitee) AND (source = 'manuel' OR signature = :signature);
+    """), conn, params={"signature": signature_regles()})
+
+
+def integrer_incremental(df_nouveau: pd.DataFrame, engine, journal=print, differer_index: bool = False) -> int:
+    """
+    Insère les opérations de `df_nouveau` (déjà classées par regex) absentes
+    de la table : leurs empreintes sont cherchées dans l'index unique, seules
+    les inconnues passent par le fuzzy matching, qui utilise les libellés
+    traités de la base comme référence. Avec `differer_index` (gros
+    volumes), les index secondaires sont supprimés pendant l'insertion et
+    reconstruits à la fin de la transaction. Renvoie le nombre de lignes réellement insérées.
+    """
+    # Relevés déjà fusionnés par scripts.pipeline : empreintes calculées par relevé
+    if "Empreinte" not in df_nouveau.columns:
+        df_nouveau = ajouter_empreintes(df_nouveau)
+
+    journal("Préparation de la table 'operations'...")
+    with engine.begin() as conn:
+        appliquer_migrations(conn)
+        colonnes = colonnes_table(conn, "operations")
+        with etape("dedoublonnage") as mesure:
+            connues = empreintes_connues(conn, df_nouveau["Empreinte"])
+            df_nouveau = df_nouveau[~df_nouveau["Empreinte"].isin(connues)]
+            mesure["lignes"] = len(df_nouveau)
+        if df_nouveau.empty:
+            journal(f"✅ 0 nouvelles opérations insérées ({len(connues)} déjà présentes)")
+            return 0
+        reference = lire_reference(conn)
+
+    journal("Classification Fuzzy...")
+    with etape("fuzzy", lignes=len(df_nouveau)):
+        df_final = appliquer_fuzzy(df_nouveau, reference=reference)
+
+    colonnes = [c for c in df_final.columns if c in colonnes and c != "id"]
+    liste = ", ".join(f'"{c}"' for c in colonnes)
+
+    journal("Insertion des nouvelles opérations...")
+    with engine.begin() as conn:
+        # Filet de sécurité si une autre intégration a inséré entre-temps les
+        # mêmes opérations : écartées par la base (ON CONFLICT), lignes = insérées
+        with etape("ecriture") as mesure:
+            # Table de travail temporaire : deux intégrations simultanées ne se gênent pas
+            copier_dataframe(df_final[colonnes], "operations_staging", conn, temporaire=True)
+            index_supprimes = supprimer_index_secondaires(conn) if differer_index else []
+            resultat = conn.execute(text(f"""
+                INSERT INTO operations ({liste})
+                SELECT {liste} FROM operations_staging
+                ORDER BY "Compte", "Date"
+                ON CONFLICT ("Empreinte") DO NOTHING;
+            """))
+            mesure["lignes"] = resultat.rowcount
+
+        with etape("bascule"):
+            recreer_index(conn, index_supprimes)
+            memoriser_fuzzy(conn, df_final)
+            rafraichir_agregats(conn)
+            incrementer_version(conn)
+
+    nb_inseres = resultat.rowcount
+    journal(f"✅ {nb_inseres} nouvelles opérations insérées ({len(connues) + len(df_final) - nb_inseres} déjà présentes)")
+    return nb_inseres
+
+
+def integrer_reconstruction(df_nouveau: pd.DataFrame, engine, journal=print, differer_index: bool = False) -> int:
+    """
+    Ancienne méthode : fusionne toute la table avec `df_nouveau` (déjà classé
+    par regex), écarte les opérations dont l'empreinte est déjà en base,
+    relance le fuzzy sur l'ensemble et remplace la table. Renvoie le nombre
+    de lignes écrites.
+    """
+    # 1. Charger l'existant
+    journal("Récupération de la base actuelle...")
+    with engine.begin() as conn:
+        appliquer_migrations(conn)
+
+    with etape("dedoublonnage") as mesure:
+        df_remote = pd.read_sql("SELECT * FROM operations;", engine)
+        df_remote["Date"] = pd.to_datetime(df_remote["Date"])
+        if "Empreinte" not in df_nouveau.columns:
+            df_nouveau = ajouter_empreintes(df_nouveau)
+
+        # 2. Déduplication : recouvrement de n'importe quelle largeur avec la base
+        colonnes_communes = [c for c in df_remote.columns if c in df_nouveau.columns]
+        connues = set(df_remote["Empreinte"])
+        df_nouveau_filtre = df_nouveau[~df_nouveau["Empreinte"].isin(connues)]
+        df_concat = pd.concat([df_remote[colonnes_communes], df_nouveau_filtre[colonnes_communes]], ignore_index=True)
+        mesure["lignes"] = len(df_concat)
+
+    # 3. Classification Fuzzy
+    journal("Classification Fuzzy...")
+    with etape("fuzzy", lignes=len(df_concat)):
+        df_final = appliquer_fuzzy(df_concat)
+
+    # 4. Rechargement de la table (schéma, index et vues conservés)
+    journal("Mise à jour de la base de données...")
+    df_final = df_final.reset_index(drop=True)
+    df_final.insert(0, "id", df_final.index + 1)
+
+    with engine.begin() as conn:
+        memoriser_fuzzy(conn, df_final)
+        return recharger_operations(conn, df_final, differer_index=differer_index)
+
+
+def integrer_releve(
+    df_nouveau: pd.DataFrame,
+    engine,
+    mode: str = "incremental",
+    journal=print,
+    differer_index: bool = False,
+    recalculer_soldes_table: bool = False,
+) -> int:
+    """
+    Intègre un relevé traité (`traiter_fichier_bancaire` + `classer_avec_cache`)
+    dans la base, recalcule au besoin les soldes courants de toute la table
+    (`recalculer_soldes_table`), puis met à jour le snapshot Parquet.
+    """
+    if mode not in MODES:
+        raise ValueError(f"❌ Mode d'intégration inconnu : {mode} (attendu : {', '.join(MODES)})")
+
+    if mode == "incremental":
+        nb_lignes = integrer_incremental(df_nouveau, engine, journal=journal, differer_index=differer_index)
+    else:
+        nb_lignes = integrer_reconstruction(df_nouveau, engine, journal=journal, differer_index=differer_index)
+
+    if recalculer_soldes_table:
+        recalculer_soldes(engine, journal=journal)
+    mettre_a_jour_snapshot(engine, nb_lignes, journal=journal)
+    return nb_lignes
+
+
+def mettre_a_jour_snapshot(engine, nb_lignes: int | None = None, journal=print) -> None:
+    """
+    Réécrit le snapshot Parquet de operations, sauf si rien n'a été inséré
+    (`nb_lignes` = 0) et qu'il porte déjà la version courante de la table.
+    """
+    # La base est à jour : un snapshot impossible à écrire n'annule rien
+    try:
+        if nb_lignes == 0 and snapshot_a_jour(engine):
+            journal("🧊 Snapshot déjà à jour")
+        else:
+            with etape("snapshot") as mesure:
+                mesure["lignes"] = ecrire_snapshot(engine)
+            journal(f"🧊 Snapshot : {mesure['lignes']} opérations")
+    except OSError as e:
+        journal(f"⚠️ Snapshot non écrit : {e}")
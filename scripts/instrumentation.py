@@ -0,0 +1,196 @@
+# ======================================================
+# 📊 Mesures par étape des intégrations de relevés
+# ======================================================
+# Une intégration (CLI ou page Upload) ouvre une `Execution` ; chaque étape
+# du traitement est entourée de `etape("nom")`, qui relève :
+# - la durée (horloge murale)
+# - le nombre de lignes traitées (renseigné par l'étape)
+# - le pic de mémoire résidente (RSS) du processus à la fin de l'étape
+#   (getrusage, toujours relevé, sans coût ; absent sous Windows)
+# - le pic de mémoire Python allouée pendant l'étape (tracemalloc), sur
+#   demande : le suivi des allocations ralentit nettement les étapes en
+#   Python pur (×5 sur l'écriture CSV du COPY), il est donc désactivé par défaut
+# Chaque mesure est écrite en JSON (une ligne par étape) dans le journal
+# "budget_app.pipeline", puis toute l'exécution dans la table pipeline_runs.
+#
+# Hors d'une Execution, `etape` ne mesure rien : les fonctions instrumentées
+# restent utilisables seules (scripts, benchmarks).
+# Étapes : lecture, regex, dedoublonnage, fuzzy, ecriture, bascule, soldes, snapshot.
+# Les étapes ne s'imbriquent pas (pic mémoire remis à zéro à chaque début).
+# ======================================================
+
+import datetime as dt
+import json
+import logging
+import sys
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+try:
+    import resource
+except ImportError:  # Windows : pas de getrusage
+    resource = None
+
+journal_json = logging.getLogger("budget_app.pipeline")
+
+_execution_courante = ContextVar("execution_courante", default=None)
+
+COLONNES_MESURE = [
+    "etape", "ordre", "debut", "duree_s", "lignes", "memoire_pic_octets", "memoire_rss_max_octets", "statut",
+]
+
+
+class Execution:
+    """
+    Mesures d'une intégration. S'utilise comme contexte : les étapes
+    exécutées à l'intérieur, y compris dans les fonctions appelées, y sont
+    ajoutées. `observateur(mesure)` est appelé à la fin de chaque étape.
+    """
+
+    def __init__(self, source: str, mode: str | None = None, memoire: bool = False, observateur=None):
+        self.id = uuid.uuid4().hex
+        self.source = source
+        self.mode = mode
+        self.memoire = memoire
+        self.observateur = observateur
+        self.etapes = []
+        self._jeton = None
+        self._arreter_tracemalloc = False
+
+    def __enter__(self) -> "Execution":
+        self._jeton = _execution_courante.set(self)
+        if self.memoire and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._arreter_tracemalloc = True
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        if self._arreter_tracemalloc:
+            tracemalloc.stop()
+            self._arreter_tracemalloc = False
+        _execution_courante.reset(self._jeton)
+        return False
+
+    def ajouter(self, mesure: dict) -> None:
+        self.etapes.append(mesure)
+        journal_json.info(json.dumps(
+            {"execution": self.id, "source": self.source, "mode": self.mode, **mesure},
+            ensure_ascii=False, default=str,
+        ))
+        if self.observateur is not None:
+            self.observateur(mesure)
+
+    def resume(self) -> pd.DataFrame:
+        """Une ligne par étape, dans l'ordre d'exécution."""
+        return pd.DataFrame(self.etapes, columns=COLONNES_MESURE)
+
+    def enregistrer(self, engine) -> int:
+        """
+        Écrit les mesures dans pipeline_runs. Une base injoignable n'empêche
+        pas l'intégration de se terminer : avertissement dans le journal, 0 ligne.
+        """
+        if not self.etapes:
+            return 0
+        lignes = [
+            {"execution": self.id, "source": self.source, "mode": self.mode, **mesure}
+            for mesure in self.etapes
+        ]
+        try:
+            with engine.begin() as conn:
+                conn.execute(text("""
+                    INSERT INTO pipeline_runs
+                        (execution, source, mode, etape, ordre, debut, duree_s, lignes,
+                         memoire_pic_octets, memoire_rss_max_octets, statut)
+                    VALUES
+                        (:execution, :source, :mode, :etape, :ordre, :debut, :duree_s, :lignes,
+                         :memoire_pic_octets, :memoire_rss_max_octets, :statut);
+                """), lignes)
+        except SQLAlchemyError as e:
+            journal_json.warning(f"⚠️ Mesures de l'exécution {self.id} non enregistrées : {e}")
+            return 0
+        return len(lignes)
+
+
+def sans_suivi_memoire() -> None:
+    """
+    Initialiseur des processus de travail : un processus créé par fork hérite
+    de tracemalloc, qui y ralentit fortement les allocations sans rien mesurer.
+    """
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def rss_max_octets() -> int | None:
+    """
+    Pic de mémoire résidente du processus depuis son démarrage (ru_maxrss,
+    en Ko sous Linux, en octets sous macOS). None si getrusage est absent.
+    """
+    if resource is None:
+        return None
+    pic = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pic if sys.platform == "darwin" else pic * 1024
+
+
+def execution_courante() -> Execution | None:
+    return _execution_courante.get()
+
+
+@contextmanager
+def etape(nom: str, lignes: int | None = None):
+    """
+    Mesure le bloc comme l'étape `nom` de l'exécution courante. Le bloc
+    reçoit la mesure (dict) et peut y renseigner `mesure["lignes"]`.
+    Une exception est propagée, l'étape étant notée en "erreur".
+    """
+    mesure = {"etape": nom, "lignes": lignes}
+    execution = execution_courante()
+    if execution is None:
+        yield mesure
+        return
+
+    memoire_depart = None
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+        memoire_depart = tracemalloc.get_traced_memory()[0]
+    debut = dt.datetime.now(dt.timezone.utc)
+    chrono = time.perf_counter()
+    statut = "erreur"
+    try:
+        yield mesure
+        statut = "ok"
+    finally:
+        duree = time.perf_counter() - chrono
+        pic = None
+        if memoire_depart is not None and tracemalloc.is_tracing():
+            pic = tracemalloc.get_traced_memory()[1] - memoire_depart
+        execution.ajouter({
+            "etape": nom,
+            "ordre": len(execution.etapes) + 1,
+            "debut": debut,
+            "duree_s": round(duree, 6),
+            "lignes": None if mesure["lignes"] is None else int(mesure["lignes"]),
+            "memoire_pic_octets": pic,
+            "memoire_rss_max_octets": rss_max_octets(),
+            "statut": statut,
+        })
+
+
+def decrire(mesure: dict) -> str:
+    """Résumé lisible d'une mesure, pour les journaux à l'écran."""
+    texte = f"⏱️ {mesure['etape']} : {mesure['duree_s']:.2f} s"
+    if mesure["lignes"] is not None:
+        texte += f", {mesure['lignes']} lignes"
+    if mesure["memoire_pic_octets"] is not None:
+        texte += f", pic mémoire {mesure['memoire_pic_octets'] / 1024 ** 2:.1f} Mo"
+    if mesure["memoire_rss_max_octets"] is not None:
+        texte += f", RSS max {mesure['memoire_rss_max_octets'] / 1024 ** 2:.0f} Mo"
+    if mesure["statut"] != "ok":
+        texte += " ❌"
+    return texte
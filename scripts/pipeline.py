@@ -1,109 +1,172 @@
-from scripts.A_traitement_donnees import traiter_fichier_bancaire
-from scripts.B_depenses import appliquer_regex, appliquer_fuzzy
-from sqlalchemy import text
-from db import engine
-import pandas as pd
-
-# ======================================================
-# 1. Lecture depuis PostgreSQL
-# ======================================================
-print("Connexion à la base PostgreSQL...")
-df_remote = pd.read_sql("SELECT * FROM operations;", engine)
-print(f"Données existantes : {len(df_remote)} lignes")
-
-# ======================================================
-# 2. Traitement du nouveau fichier bancaire
-# ======================================================
-fichier_excel = "/Users/josephbarreau/Documents/python/expenses_tracker/V2/CA20251229_102636.xlsx"
-df_nouveau = traiter_fichier_bancaire(fichier_excel)
-df_nouveau = appliquer_regex(df_nouveau)
-#df_remote = appliquer_regex(df_remote)
-
-# ======================================================
-# 3. Harmonisation des colonnes
-# ======================================================
-colonnes_communes = list(set(df_remote.columns) & set(df_nouveau.columns))
-df_remote_aligne = df_remote[colonnes_communes].copy()
-df_nouveau_aligne = df_nouveau[colonnes_communes].copy()
-
-# ======================================================
-# 4. Filtrage des nouvelles opérations
-# ======================================================
-date_max_remote = df_remote_aligne["Date"].max()
-print(f"Dernière date dans la base existante : {date_max_remote.strftime('%d/%m/%Y')}")
-
-df_nouveau_filtre = df_nouveau_aligne[df_nouveau_aligne["Date"] >= date_max_remote]
-print(f"{len(df_nouveau_filtre)} nouvelles opérations à partir du {date_max_remote.strftime('%d/%m/%Y')}")
-
-# ======================================================
-# 5. Fusion et déduplication ciblée
-# ======================================================
-df_concat = pd.concat([df_remote_aligne, df_nouveau_filtre], ignore_index=True)
-print(f"Fusion effectuée : {len(df_concat)} lignes avant déduplication")
-
-mask_date_max = df_concat["Date"] == date_max_remote
-doublons_date_max = df_concat[mask_date_max].duplicated(subset=["Date", "Libellé", "Montant", "Compte"], keep="first")
-
-nb_doublons = doublons_date_max.sum()
-if nb_doublons > 0:
-    print(f"{nb_doublons} doublons détectés sur la date {date_max_remote.strftime('%d/%m/%Y')} — supprimés")
-    df_concat = df_concat[~(mask_date_max & doublons_date_max)]
-else:
-    print("Aucun doublon détecté sur la date la plus récente")
-
-print(f"Nettoyage terminé : {len(df_concat)} lignes uniques")
-
-
-# ======================================================
-# 6. Classification fuzzy
-# ======================================================
-df_final = appliquer_fuzzy(df_concat)
-
-# ======================================================
-# 7. Chargement dans une table temporaire PostgreSQL
-# ======================================================
-print("Chargement dans la table temporaire 'operations_temp'...")
-
-# 1️⃣ Supprimer proprement la table existante (et ses index)
-with engine.connect() as conn:
-    conn.execute(text("DROP TABLE IF EXISTS operations_temp CASCADE;"))
-    conn.commit()
-
-# 2️⃣ Créer un index 'id' manuellement après insertion
-# On ajoute la colonne id avant l'export SQL
-df_final = df_final.reset_index(drop=True)
-df_final.insert(0, "id", df_final.index + 1)  # id commence à 1
-
-# 3️⃣ Exporter vers PostgreSQL sans laisser pandas créer d’index automatique
-df_final.to_sql("operations_temp", engine, if_exists="replace", index=False)
-
-# 4️⃣ Définir l'id comme PRIMARY KEY + index
-with engine.begin() as conn:
-    conn.execute(text("""
-        ALTER TABLE operations_temp
-        ADD PRIMARY KEY (id);
-    """))
-    conn.execute(text("""
-        CREATE INDEX IF NOT EXISTS ix_operations_temp_id
-        ON operations_temp (id);
-    """))
-
-print("Table temporaire 'operations_temp' chargée et indexée avec succès.")
-
-
 # ======================================================
-# 8. Sauvegarde de la table existante et remplacement
-# ======================================================
-
-with engine.begin() as conn:
-    print("Sauvegarde de la table actuelle en 'operations_old'...")
-    conn.execute(text("DROP TABLE IF EXISTS operations_old CASCADE;"))
-    conn.execute(text("ALTER TABLE operations RENAME TO operations_old;"))
-
-    print("Remplacement par la nouvelle table...")
-    conn.execute(text("ALTER TABLE operations_temp RENAME TO operations;"))
+# 🚀 Intégration de relevés bancaires en ligne de commande
+# ======================================================
+# Exemples :
+#   python -m scripts.pipeline ~/releves/                      # tous les CA*.xlsx du dossier
+#   python -m scripts.pipeline "~/releves/CA2024*.xlsx" -j 4   # motif glob
+#   python -m scripts.pipeline CA20251229_102636.xlsx --mode reconstruction
+#   python -m scripts.pipeline --recalculer-soldes                # soldes de toute la table seulement
+#
+# Étapes :
+# 1. Lecture des fichiers en parallèle (un processus par fichier)
+# 2. Fusion et dédoublonnage des opérations communes à plusieurs relevés
+# 3. Classification (cache libellé → catégorie + regex) en une passe
+# 4. Chargement en une transaction, index secondaires reconstruits à la fin
+#
+# Durée, lignes, RSS max (et pic mémoire avec --memoire) de chaque étape : affichés,
+# écrits en JSON sur la sortie d'erreur (journal "budget_app.pipeline") et
+# dans pipeline_runs.
+# ======================================================
+
+import argparse
+import contextlib
+import glob
+import io
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
 
-    print("Suppression des tables temporaires résiduelles (par sécurité)...")
-    conn.execute(text("DROP TABLE IF EXISTS operations_temp CASCADE;"))
+import pandas as pd
 
-print("✅ Mise à jour terminée avec succès.")
+from db import get_engine
+from scripts.A_traitement_donnees import traiter_fichier_bancaire
+from scripts.cache_categories import classer_avec_cache
+from scripts.dedoublonnage import ajouter_empreintes
+from scripts.ingestion import MODES, integrer_releve, mettre_a_jour_snapshot, recalculer_soldes
+from scripts.instrumentation import Execution, decrire, etape, journal_json, sans_suivi_memoire
+
+MOTIF_RELEVES = "CA*.xlsx"
+
+
+def lister_fichiers(chemins, motif: str = MOTIF_RELEVES) -> list[str]:
+    """
+    Fichiers désignés par `chemins` : un dossier donne ses fichiers `motif`,
+    un motif glob ses correspondances, un fichier lui-même.
+    Triés par nom (les exports CA sont datés) et sans doublon.
+    """
+    fichiers = []
+    for chemin in chemins:
+        chemin = os.path.expanduser(chemin)
+        if os.path.isdir(chemin):
+            fichiers += glob.glob(os.path.join(chemin, motif))
+        elif glob.has_magic(chemin):
+            fichiers += glob.glob(chemin)
+        else:
+            fichiers.append(chemin)
+    return sorted(set(fichiers), key=os.path.basename)
+
+
+def lire_releve(fichier: str) -> pd.DataFrame:
+    """Lit un relevé dans un processus du pool (journal du traitement mis en sourdine)."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        df = traiter_fichier_bancaire(fichier)
+    # Empreintes calculées relevé par relevé : une opération présente dans
+    # deux relevés qui se chevauchent garde la même empreinte
+    return ajouter_empreintes(df)
+
+
+def lire_releves(fichiers, workers: int | None = None) -> pd.DataFrame:
+    """
+    Lit les relevés en parallèle puis les fusionne. Les opérations présentes
+    dans plusieurs relevés (même empreinte) ne sont gardées qu'une fois,
+    dans le relevé le plus récent. Lève une erreur si un fichier est illisible.
+    La mémoire mesurée pour la lecture est celle du processus principal
+    (réception des DataFrames), pas celle des processus du pool.
+    """
+    erreurs = []
+    dataframes = []
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=sans_suivi_memoire)
+    with etape("lecture") as mesure, pool:
+        for fichier, futur in [(f, pool.submit(lire_releve, f)) for f in fichiers]:
+            try:
+                df = futur.result()
+            except Exception as e:
+                erreurs.append(f"   - {fichier} : {e}")
+                continue
+            print(f"📄 {os.path.basename(fichier)} : {len(df)} opérations")
+            dataframes.append(df)
+        mesure["lignes"] = sum(len(df) for df in dataframes)
+
+    if erreurs:
+        raise ValueError("❌ Relevés illisibles, rien n'a été chargé :\n" + "\n".join(erreurs))
+
+    with etape("dedoublonnage") as mesure:
+        df = fusionner_releves(dataframes)
+        mesure["lignes"] = len(df)
+    print(f"🔗 {len(df)} opérations distinctes après fusion de {len(dataframes)} relevé(s)")
+    return df
+
+
+def fusionner_releves(dataframes) -> pd.DataFrame:
+    """Concatène des relevés lus par `lire_releve` ; une opération commune n'est gardée que dans le dernier."""
+    df = pd.concat(dataframes, ignore_index=True)
+    return df.drop_duplicates(subset="Empreinte", keep="last").reset_index(drop=True)
+
+
+def main(arguments=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m scripts.pipeline",
+        description="Intègre un ou plusieurs relevés bancaires (Excel) dans la base.",
+    )
+    parser.add_argument("chemins", nargs="*", help="fichiers, dossiers ou motifs glob (entre guillemets)")
+    parser.add_argument("--motif", default=MOTIF_RELEVES, help=f"fichiers retenus dans un dossier (défaut : {MOTIF_RELEVES})")
+    parser.add_argument(
+        "--mode", choices=MODES, default="incremental",
+        help="incremental : insère seulement les nouvelles opérations ; reconstruction : relit et réécrit toute la table",
+    )
+    parser.add_argument("-j", "--workers", type=int, default=None, help="processus de lecture (défaut : nombre de cœurs)")
+    parser.add_argument("--memoire", action="store_true", help="mesure aussi le pic mémoire de chaque étape (plus lent)")
+    parser.add_argument(
+        "--recalculer-soldes", action="store_true",
+        help="recalcule ensuite le solde courant de toute la table (seule étape si aucun relevé n'est donné)",
+    )
+    args = parser.parse_args(arguments)
+
+    fichiers = lister_fichiers(args.chemins, args.motif)
+    if not fichiers and not (args.recalculer_soldes and not args.chemins):
+        parser.error("aucun fichier de relevé trouvé")
+
+    # Mesures en JSON sur la sortie d'erreur (une ligne par étape)
+    logging.basicConfig(format="%(message)s")
+    journal_json.setLevel(logging.INFO)
+
+    engine = get_engine()
+    execution = Execution("cli", mode=args.mode, memoire=args.memoire, observateur=lambda mesure: print(decrire(mesure)))
+    try:
+        with execution:
+            if not fichiers:
+                recalculer_soldes(engine)
+                mettre_a_jour_snapshot(engine, 0)
+                print("✅ Soldes courants à jour.")
+                return 0
+
+            # ======================================================
+            # 1. Lecture parallèle et fusion des relevés
+            # ======================================================
+            print(f"📂 {len(fichiers)} relevé(s) à traiter")
+            try:
+                df_nouveau = lire_releves(fichiers, workers=args.workers)
+            except ValueError as e:
+                print(e)
+                return 1
+
+            # ======================================================
+            # 2. Classification, déduplication en base et chargement
+            # ======================================================
+            df_nouveau = classer_avec_cache(df_nouveau, engine)
+
+            print(f"Intégration en mode '{args.mode}'...")
+            integrer_releve(
+                df_nouveau, engine, mode=args.mode, differer_index=True,
+                recalculer_soldes_table=args.recalculer_soldes,
+            )
+    finally:
+        execution.enregistrer(engine)
+
+    print("✅ Mise à jour terminée avec succès.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,371 @@
+# ======================================================
+# 🧱 Schéma de la base et migrations versionnées
+# ======================================================
+# La table operations est définie ici une fois pour toutes (types, index)
+# au lieu d'être recréée implicitement par `to_sql` à chaque script.
+# Chaque migration n'est appliquée qu'une fois : la table schema_migrations
+# garde la trace des versions passées.
+#
+#   python -m scripts.schema   → applique les migrations en attente
+# ======================================================
+
+from sqlalchemy import text
+
+from db import incrementer_version
+from scripts.agregats import VUES, creer_agregats
+from scripts.dedoublonnage import recalculer_empreintes
+
+# Verrou consultatif : deux processus ne migrent jamais en même temps
+CLE_VERROU_MIGRATIONS = 724_310_001
+
+MONTANT = "NUMERIC(12, 2)"
+
+# Schéma figé de la migration 001 (COLONNES_OPERATIONS, DDL_OPERATIONS) :
+# une colonne ou un index ajouté ensuite l'est par sa propre migration, pour
+# qu'une base neuve et une base mise à jour aient le même schéma.
+
+# Colonnes typées de operations : nom → (type SQL, conversion depuis l'ancien type)
+COLONNES_OPERATIONS = {
+    "Date": ("DATE", 'CAST("Date" AS DATE)'),
+    "Libellé": ("TEXT", 'CAST("Libellé" AS TEXT)'),
+    "Débit euros": (MONTANT, 'ROUND(CAST("Débit euros" AS NUMERIC), 2)'),
+    "Crédit euros": (MONTANT, 'ROUND(CAST("Crédit euros" AS NUMERIC), 2)'),
+    "Montant": (MONTANT, 'ROUND(CAST("Montant" AS NUMERIC), 2)'),
+    "Solde final": (MONTANT, 'ROUND(CAST("Solde final" AS NUMERIC), 2)'),
+    "Date solde final": ("DATE", 'CAST("Date solde final" AS DATE)'),
+    "Solde courant": (MONTANT, 'ROUND(CAST("Solde courant" AS NUMERIC), 2)'),
+    "Compte": ("INTEGER", 'CAST("Compte" AS INTEGER)'),
+    "Categorie": ("TEXT", 'CAST("Categorie" AS TEXT)'),
+    "Mot_trouve": ("TEXT", 'CAST("Mot_trouve" AS TEXT)'),
+    # "Traitee" a pu être écrit en texte ('True', '1.0'...) par les anciens scripts
+    "Traitee": ("BOOLEAN", """COALESCE(CAST("Traitee" AS TEXT) IN ('true', 'True', 'TRUE', 't', '1', '1.0'), FALSE)"""),
+    "Occurrence": ("INTEGER", 'CAST("Occurrence" AS INTEGER)'),
+}
+
+DDL_OPERATIONS = """
+    CREATE TABLE operations (
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        "Date" DATE,
+        "Libellé" TEXT,
+        "Débit euros" NUMERIC(12, 2),
+        "Crédit euros" NUMERIC(12, 2),
+        "Montant" NUMERIC(12, 2),
+        "Solde final" NUMERIC(12, 2),
+        "Date solde final" DATE,
+        "Solde courant" NUMERIC(12, 2),
+        "Compte" INTEGER NOT NULL,
+        "Categorie" TEXT NOT NULL DEFAULT 'Autres',
+        "Mot_trouve" TEXT,
+        "Traitee" BOOLEAN NOT NULL DEFAULT FALSE,
+        "Occurrence" INTEGER NOT NULL DEFAULT 0
+    );
+"""
+
+# Opérations "Autres" à catégoriser à la main (file de la page Dépenses) ;
+# reprend le prédicat de l'index créé par la migration 008
+CONDITION_A_TRAITER = """"Categorie" = 'Autres' AND NOT "Traitee" AND "Débit euros" IS NOT NULL"""
+
+
+def colonnes_table(conn, table: str) -> dict[str, str]:
+    """Colonnes de `table` dans l'ordre : nom → type (information_schema)."""
+    lignes = conn.execute(text("""
+        SELECT column_name, data_type FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = :table
+        ORDER BY ordinal_position
+    """), {"table": table}).all()
+    return dict(lignes)
+
+
+def supprimer_index_secondaires(conn) -> list[str]:
+    """
+    Supprime les index non uniques de operations avant un chargement massif
+    (l'index des empreintes reste, ON CONFLICT en a besoin) et renvoie leurs
+    définitions (pg_get_indexdef), à repasser à `recreer_index`. Lues dans
+    le catalogue : ce sont celles laissées par les migrations appliquées.
+    """
+    index = conn.execute(text("""
+        SELECT c.relname, pg_get_indexdef(i.indexrelid)
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = CAST('operations' AS regclass) AND NOT i.indisunique
+    """)).all()
+    for nom, _ in index:
+        conn.execute(text(f'DROP INDEX "{nom}";'))
+    return [definition for _, definition in index]
+
+
+def recreer_index(conn, definitions) -> None:
+    """Recrée les index supprimés par `supprimer_index_secondaires`."""
+    for definition in definitions:
+        conn.execute(text(definition))
+
+
+# -----------------------------
+# Migrations
+# -----------------------------
+def _m001_operations_typee(conn) -> None:
+    colonnes = colonnes_table(conn, "operations")
+    if not colonnes:
+        conn.execute(text(DDL_OPERATIONS))
+        return
+
+    # Les vues matérialisées bloquent les changements de type : recréées en 004
+    for nom in VUES:
+        conn.execute(text(f"DROP MATERIALIZED VIEW IF EXISTS {nom};"))
+
+    for nom, (type_sql, conversion) in COLONNES_OPERATIONS.items():
+        if nom not in colonnes:
+            conn.execute(text(f'ALTER TABLE operations ADD COLUMN "{nom}" {type_sql};'))
+        else:
+            conn.execute(text(f'ALTER TABLE operations ALTER COLUMN "{nom}" TYPE {type_sql} USING {conversion};'))
+
+    # Colonne de travail du fuzzy matching, écrite par erreur par les anciennes reconstructions
+    conn.execute(text('ALTER TABLE operations DROP COLUMN IF EXISTS "EstTraitee";'))
+
+    conn.execute(text("""UPDATE operations SET "Categorie" = 'Autres' WHERE "Categorie" IS NULL;"""))
+    conn.execute(text("""ALTER TABLE operations ALTER COLUMN "Categorie" SET DEFAULT 'Autres';"""))
+    conn.execute(text('ALTER TABLE operations ALTER COLUMN "Categorie" SET NOT NULL;'))
+    conn.execute(text('ALTER TABLE operations ALTER COLUMN "Traitee" SET DEFAULT FALSE;'))
+    conn.execute(text('ALTER TABLE operations ALTER COLUMN "Traitee" SET NOT NULL;'))
+    conn.execute(text('ALTER TABLE operations ALTER COLUMN "Compte" SET NOT NULL;'))
+
+    # Numérotation des opérations identiques pour l'historique sans "Occurrence"
+    conn.execute(text("""
+        UPDATE operations o
+        SET "Occurrence" = r.rang
+        FROM (
+            SELECT id, ROW_NUMBER() OVER (
+                PARTITION BY "Compte", "Date", "Libellé", "Montant" ORDER BY id
+            ) - 1 AS rang
+            FROM operations
+        ) r
+        WHERE o.id = r.id AND o."Occurrence" IS NULL;
+    """))
+    conn.execute(text('ALTER TABLE operations ALTER COLUMN "Occurrence" SET DEFAULT 0;'))
+    conn.execute(text('ALTER TABLE operations ALTER COLUMN "Occurrence" SET NOT NULL;'))
+
+    # id auto-incrémenté, repris après le plus grand id existant
+    identite = conn.execute(text("""
+        SELECT is_identity FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'operations' AND column_name = 'id'
+    """)).scalar()
+    if identite != "YES":
+        conn.execute(text("ALTER TABLE operations ALTER COLUMN id SET NOT NULL;"))
+        conn.execute(text("ALTER TABLE operations ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY;"))
+        conn.execute(text("""
+            SELECT setval(pg_get_serial_sequence('operations', 'id'), COALESCE(MAX(id), 0) + 1, false)
+            FROM operations;
+        """))
+    a_cle_primaire = conn.execute(text("""
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'operations'::regclass AND contype = 'p'
+    """)).scalar()
+    if not a_cle_primaire:
+        conn.execute(text("ALTER TABLE operations ADD PRIMARY KEY (id);"))
+
+
+def _m002_index_operations(conn) -> None:
+    # Index hérités des anciens scripts (doublons de la clé primaire / de la clé naturelle)
+    conn.execute(text("DROP INDEX IF EXISTS ix_operations_temp_id;"))
+    conn.execute(text("DROP INDEX IF EXISTS ux_operations_cle_naturelle;"))
+    # Clé naturelle (insertion incrémentale, ON CONFLICT DO NOTHING)
+    conn.execute(text("""
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_operations_cle_naturelle
+        ON operations ("Compte", "Date", "Libellé", "Montant", "Occurrence");
+    """))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_operations_compte_date ON operations ("Compte", "Date");'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_operations_categorie ON operations ("Categorie");'))
+    # File des opérations "Autres" à catégoriser à la main
+    conn.execute(text("""
+        CREATE INDEX IF NOT EXISTS ix_operations_a_traiter
+        ON operations ("Date", id) WHERE "Categorie" = 'Autres' AND NOT "Traitee";
+    """))
+
+
+def _m003_table_versions(conn) -> None:
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS table_versions (
+            nom TEXT PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0
+        );
+    """))
+
+
+def _m004_agregats(conn) -> None:
+    creer_agregats(conn)
+
+
+def _m005_label_categories(conn) -> None:
+    # Cache libellé → catégorie (scripts/cache_categories.py)
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS label_categories (
+            libelle TEXT PRIMARY KEY,
+            categorie TEXT NOT NULL,
+            mot_trouve TEXT,
+            traitee BOOLEAN NOT NULL DEFAULT TRUE,
+            source TEXT NOT NULL CHECK (source IN ('regex', 'fuzzy', 'manuel')),
+            signature TEXT NOT NULL,
+            vu_le TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+    """))
+
+
+def _m006_pipeline_runs(conn) -> None:
+    # Mesures par étape des intégrations (scripts/instrumentation.py)
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS pipeline_runs (
+            id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+            execution TEXT NOT NULL,
+            source TEXT NOT NULL,
+            mode TEXT,
+            etape TEXT NOT NULL,
+            ordre INTEGER NOT NULL,
+            debut TIMESTAMPTZ NOT NULL,
+            duree_s DOUBLE PRECISION NOT NULL,
+            lignes BIGINT,
+            memoire_pic_octets BIGINT,
+            statut TEXT NOT NULL CHECK (statut IN ('ok', 'erreur'))
+        );
+    """))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_pipeline_runs_debut ON pipeline_runs (debut);"))
+
+
+def _m007_empreintes(conn) -> None:
+    # Empreinte de chaque opération à la place de la clé naturelle à cinq colonnes,
+    # supprimée avant la renumérotation : deux libellés ne différant que par la
+    # casse ou les espaces la violeraient le temps de l'UPDATE
+    conn.execute(text("DROP INDEX IF EXISTS ux_operations_cle_naturelle;"))
+    conn.execute(text('ALTER TABLE operations ADD COLUMN IF NOT EXISTS "Empreinte" TEXT;'))
+    recalculer_empreintes(conn)
+    conn.execute(text('ALTER TABLE operations ALTER COLUMN "Empreinte" SET NOT NULL;'))
+    # Insertion incrémentale : ON CONFLICT ("Empreinte") DO NOTHING
+    conn.execute(text('CREATE UNIQUE INDEX IF NOT EXISTS ux_operations_empreinte ON operations ("Empreinte");'))
+
+
+def _m008_index_a_traiter(conn) -> None:
+    # Prédicat de l'index aligné sur celui de la file (comptage par parcours d'index seul)
+    conn.execute(text("DROP INDEX IF EXISTS ix_operations_a_traiter;"))
+    # File des opérations à catégoriser : pagination par clé (Date, id) et comptage
+    conn.execute(text("""
+        CREATE INDEX ix_operations_a_traiter ON operations ("Date", id)
+        WHERE "Categorie" = 'Autres' AND NOT "Traitee" AND "Débit euros" IS NOT NULL;
+    """))
+
+
+def _m009_index_top_depenses(conn) -> None:
+    # ix_operations_categorie_debit sert aussi les recherches par catégorie seule
+    conn.execute(text("DROP INDEX IF EXISTS ix_operations_categorie;"))
+    # Plus grosses dépenses (Top 20), toutes catégories ou une seule : parcours d'index seul
+    conn.execute(text("""
+        CREATE INDEX IF NOT EXISTS ix_operations_debit
+        ON operations ("Débit euros" DESC) INCLUDE ("Date", "Categorie", "Libellé");
+    """))
+    conn.execute(text("""
+        CREATE INDEX IF NOT EXISTS ix_operations_categorie_debit
+        ON operations ("Categorie", "Débit euros" DESC) INCLUDE ("Date", "Libellé");
+    """))
+
+
+def _m010_index_date(conn) -> None:
+    # Dépenses d'une période au jour près, bornes de dates : parcours d'index seul
+    conn.execute(text("""
+        CREATE INDEX IF NOT EXISTS ix_operations_date
+        ON operations ("Date") INCLUDE ("Categorie", "Débit euros");
+    """))
+
+
+def _m011_agregats_nb_debits(conn) -> None:
+    # nb_debits ne compte plus les crédits (débit à 0) : vues recréées
+    for nom in VUES:
+        conn.execute(text(f"DROP MATERIALIZED VIEW IF EXISTS {nom};"))
+    creer_agregats(conn)
+
+
+def _m012_cache_sans_autres_manuel(conn) -> None:
+    # Choix manuels "Autres" mémorisés par erreur : ils écartaient le libellé de la file
+    resultat = conn.execute(text("""
+        DELETE FROM label_categories WHERE source = 'manuel' AND categorie = 'Autres';
+    """))
+    if resultat.rowcount:
+        incrementer_version(conn, "label_categories")
+
+
+def _m013_pipeline_runs_rss(conn) -> None:
+    # Pic de mémoire résidente du processus, relevé à chaque étape (sans tracemalloc)
+    conn.execute(text("ALTER TABLE pipeline_runs ADD COLUMN IF NOT EXISTS memoire_rss_max_octets BIGINT;"))
+
+
+def _m014_reference_fuzzy(conn) -> None:
+    # Le fuzzy lit sa référence dans le cache : libellés traités de l'historique
+    # ajoutés une fois (catégorie la plus fréquente), sans écraser l'existant
+    from scripts.cache_categories import signature_regles
+
+    resultat = conn.execute(text("""
+        INSERT INTO label_categories (libelle, categorie, traitee, source, signature)
+        SELECT DISTINCT ON ("Libellé") "Libellé", "Categorie", TRUE, 'fuzzy', :signature
+        FROM (
+            SELECT "Libellé", "Categorie", COUNT(*) AS n
+            FROM operations
+            WHERE ("Categorie" <> 'Autres' OR "Traitee") AND "Libellé" IS NOT NULL
+            GROUP BY 1, 2
+        ) t
+        ORDER BY "Libellé", n DESC, "Categorie"
+        ON CONFLICT (libelle) DO NOTHING;
+    """), {"signature": signature_regles()})
+    if resultat.rowcount:
+        incrementer_version(conn, "label_categories")
+
+
+MIGRATIONS = [
+    (1, "Table operations typée (date, numeric(12,2), booléen, NOT NULL)", _m001_operations_typee),
+    (2, "Index de operations", _m002_index_operations),
+    (3, "Compteurs de version des tables", _m003_table_versions),
+    (4, "Vues matérialisées des agrégats mensuels", _m004_agregats),
+    (5, "Cache libellé → catégorie", _m005_label_categories),
+    (6, "Mesures des intégrations", _m006_pipeline_runs),
+    (7, "Empreinte des opérations (dédoublonnage)", _m007_empreintes),
+    (8, "Index de la file des opérations à catégoriser", _m008_index_a_traiter),
+    (9, "Index des plus grosses dépenses", _m009_index_top_depenses),
+    (10, "Index des dépenses par période", _m010_index_date),
+    (11, "Nombre de débits des agrégats mensuels", _m011_agregats_nb_debits),
+    (12, 'Cache sans choix manuels "Autres"', _m012_cache_sans_autres_manuel),
+    (13, "Pic de mémoire résidente des intégrations", _m013_pipeline_runs_rss),
+    (14, "Référence du fuzzy dans le cache libellé → catégorie", _m014_reference_fuzzy),
+]
+
+
+def appliquer_migrations(conn) -> list[int]:
+    """
+    Applique, dans l'ordre et dans la transaction de `conn`, les migrations
+    pas encore passées. Renvoie les versions appliquées.
+    """
+    conn.execute(text("SELECT pg_advisory_xact_lock(:cle);"), {"cle": CLE_VERROU_MIGRATIONS})
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            appliquee_le TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+    """))
+    deja = set(conn.execute(text("SELECT version FROM schema_migrations;")).scalars())
+
+    appliquees = []
+    for version, description, migration in MIGRATIONS:
+        if version in deja:
+            continue
+        print(f"🧱 Migration {version:03d} : {description}")
+        migration(conn)
+        conn.execute(
+            text("INSERT INTO schema_migrations (version, description) VALUES (:v, :d);"),
+            {"v": version, "d": description},
+        )
+        appliquees.append(version)
+    return appliquees
+
+
+if __name__ == "__main__":
+    from db import get_engine
+
+    with get_engine().begin() as conn:
+        versions = appliquer_migrations(conn)
+    print(f"✅ Schéma à jour ({len(versions)} migration(s) appliquée(s)).")
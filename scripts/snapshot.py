@@ -0,0 +1,96 @@
+# ======================================================
+# 🧊 Snapshot Parquet de la table operations
+# ======================================================
+# Copie typée (dates, montants float, booléens) de operations écrite après
+# chaque intégration réussie. Elle porte la version de la table
+# (table_versions) dans ses métadonnées :
+# - démarrage à froid : si la version correspond, l'app lit le snapshot au
+#   lieu de transférer toute la table depuis PostgreSQL
+# - mode hors ligne : base injoignable → pages en lecture seule sur le snapshot
+# - analyses ponctuelles : pd.read_parquet(..., columns=[...])
+# ======================================================
+
+import os
+import tempfile
+
+import pandas as pd
+from sqlalchemy import text
+
+from db import lire_version
+
+CHEMIN_SNAPSHOT = os.getenv(
+    "SNAPSHOT_OPERATIONS",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "snapshots", "operations.parquet"),
+)
+CLE_VERSION = b"budget_app.version_operations"
+
+COLONNES_DATES = ["Date", "Date solde final"]
+
+
+def ecrire_snapshot(engine, chemin: str = CHEMIN_SNAPSHOT) -> int:
+    """
+    Écrit toute la table operations et sa version (lues dans la même
+    transaction) dans `chemin`, en remplaçant l'ancien fichier d'un coup.
+    Renvoie le nombre de lignes écrites.
+    """
+    # Import à l'appel : pyarrow.parquet n'est chargé que pour écrire ou lire un snapshot
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    with engine.connect().execution_options(isolation_level="REPEATABLE READ") as conn:
+        with conn.begin():
+            version = lire_version(conn)
+            df = pd.read_sql(text("SELECT * FROM operations ORDER BY id;"), conn)
+
+    for col in COLONNES_DATES:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col])
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), CLE_VERSION: str(version).encode()})
+
+    # Fichier temporaire propre à cet appel : deux écritures simultanées (CLI,
+    # upload, D_adjust_data) ne se l'écrasent pas avant os.replace
+    os.makedirs(os.path.dirname(chemin), exist_ok=True)
+    descripteur, temporaire = tempfile.mkstemp(dir=os.path.dirname(chemin), suffix=".tmp")
+    os.close(descripteur)
+    os.chmod(temporaire, 0o644)  # mkstemp crée le fichier en 0600
+    try:
+        pq.write_table(table, temporaire, compression="zstd")
+        os.replace(temporaire, chemin)
+    except BaseException:
+        os.remove(temporaire)
+        raise
+    return len(df)
+
+
+def version_snapshot(chemin: str = CHEMIN_SNAPSHOT) -> int | None:
+    """Version de operations enregistrée dans le snapshot (None s'il n'existe pas)."""
+    if not os.path.exists(chemin):
+        return None
+    import pyarrow.parquet as pq
+
+    metadonnees = pq.read_schema(chemin).metadata or {}
+    version = metadonnees.get(CLE_VERSION)
+    return int(version) if version is not None else None
+
+
+def snapshot_a_jour(engine, chemin: str = CHEMIN_SNAPSHOT) -> bool:
+    """Vrai si le snapshot porte la version courante de operations (rien à réécrire)."""
+    with engine.connect() as conn:
+        version = lire_version(conn)
+    return version_snapshot(chemin) == version
+
+
+def lire_snapshot(colonnes=None, chemin: str = CHEMIN_SNAPSHOT) -> pd.DataFrame:
+    """Lit le snapshot, limité à `colonnes` si fourni (lecture en colonnes, le reste n'est pas décodé)."""
+    if not os.path.exists(chemin):
+        raise FileNotFoundError(f"❌ Snapshot introuvable : {chemin}")
+    return pd.read_parquet(chemin, columns=list(colonnes) if colonnes is not None else None)
+
+
+if __name__ == "__main__":
+    from db import get_engine
+
+    nb = ecrire_snapshot(get_engine())
+    print(f"🧊 Snapshot écrit : {nb} opérations → {CHEMIN_SNAPSHOT}")
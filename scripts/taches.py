@@ -0,0 +1,143 @@
+# ======================================================
+# 🧵 Intégrations de relevés en arrière-plan
+# ======================================================
+# Une intégration peut durer plus longtemps qu'une session Streamlit
+# (websocket coupée, onglet fermé). La page Upload dépose le fichier (ses
+# octets) avec soumettre() et garde l'identifiant de tâche renvoyé ; la
+# tâche tourne dans un thread du serveur, indépendant des sessions, et la
+# page interroge son état (lire_tache) à intervalle régulier.
+#
+# - plusieurs threads : lecture et classification de relevés différents en
+#   même temps ; seule l'écriture en base (integrer_releve), qui réécrit les
+#   mêmes tables, passe l'une après l'autre (les suivantes sont "en_attente")
+# - un fichier déjà en attente ou en cours (même empreinte SHA-256 des
+#   octets et même mode) n'est pas relancé : soumettre() renvoie sa tâche
+# - registre en mémoire, limité aux TACHES_CONSERVEES dernières tâches et
+#   effacé au redémarrage du serveur (les mesures restent dans pipeline_runs)
+# ======================================================
+
+import datetime as dt
+import hashlib
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from db import get_engine
+from scripts.A_traitement_donnees import traiter_fichier_bancaire
+from scripts.cache_categories import classer_avec_cache
+from scripts.ingestion import MODES, integrer_releve
+from scripts.instrumentation import Execution, etape
+
+ETATS_ACTIFS = ("en_attente", "en_cours")
+TACHES_CONSERVEES = 20
+NB_THREADS = 4
+
+_taches = OrderedDict()
+_verrou = threading.Lock()
+# Écritures en base : une intégration à la fois
+_verrou_ecriture = threading.Lock()
+_executeur = None
+
+
+class Tache:
+    """État d'une intégration soumise : lu par la page, modifié par le thread de travail."""
+
+    def __init__(self, empreinte: str, nom_fichier: str, mode: str, memoire: bool = False):
+        self.id = uuid.uuid4().hex
+        self.empreinte = empreinte
+        self.nom_fichier = nom_fichier
+        self.mode = mode
+        self.etat = "en_attente"
+        self.messages = []
+        self.nb_lignes = None
+        self.erreur = None
+        self.soumise_le = dt.datetime.now()
+        self.terminee_le = None
+        # Mesures par étape, lues pendant l'exécution pour afficher la progression
+        self.execution = Execution("upload", mode=mode, memoire=memoire)
+
+    @property
+    def active(self) -> bool:
+        return self.etat in ETATS_ACTIFS
+
+    def journal(self, message) -> None:
+        self.messages.append(str(message))
+
+
+def empreinte(contenu: bytes, mode: str) -> str:
+    return hashlib.sha256(mode.encode() + b"\0" + contenu).hexdigest()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executeur
+    if _executeur is None:
+        _executeur = ThreadPoolExecutor(max_workers=NB_THREADS, thread_name_prefix="integration")
+    return _executeur
+
+
+def soumettre(contenu: bytes, nom_fichier: str, mode: str = "incremental", memoire: bool = False) -> str:
+    """
+    Met en file l'intégration du relevé `contenu` (octets du .xlsx) et renvoie
+    l'identifiant de la tâche, ou celui de la tâche identique encore active.
+    """
+    if mode not in MODES:
+        raise ValueError(f"❌ Mode d'intégration inconnu : {mode} (attendu : {', '.join(MODES)})")
+    cle = empreinte(contenu, mode)
+
+    with _verrou:
+        for tache in _taches.values():
+            if tache.empreinte == cle and tache.active:
+                return tache.id
+
+        tache = Tache(cle, nom_fichier, mode, memoire)
+        _taches[tache.id] = tache
+        # Oubli des plus anciennes tâches terminées
+        terminees = [t.id for t in _taches.values() if not t.active]
+        for ancienne in terminees[:max(0, len(_taches) - TACHES_CONSERVEES)]:
+            del _taches[ancienne]
+        _pool().submit(_executer, tache, contenu)
+    return tache.id
+
+
+def lire_tache(id_tache: str) -> Tache | None:
+    return _taches.get(id_tache)
+
+
+def _executer(tache: Tache, contenu: bytes) -> None:
+    """Corps d'une tâche (thread de travail) : lecture, classification, intégration."""
+    tache.etat = "en_cours"
+    etat = "echec"
+    engine = None
+    try:
+        engine = get_engine()
+        with tache.execution:
+            # Lecture en mémoire, directement depuis les octets reçus
+            tache.journal(f"Analyse du nouveau fichier {tache.nom_fichier}...")
+            with etape("lecture") as mesure:
+                df_nouveau = traiter_fichier_bancaire(contenu)
+                mesure["lignes"] = len(df_nouveau)
+            df_nouveau = classer_avec_cache(df_nouveau, engine)
+            df_nouveau["Date"] = pd.to_datetime(df_nouveau["Date"])
+
+            # Déduplication, fuzzy et écriture en base, après les intégrations en cours
+            if not _verrou_ecriture.acquire(blocking=False):
+                tache.etat = "en_attente"
+                tache.journal("En attente de la fin d'une autre intégration...")
+                _verrou_ecriture.acquire()
+                tache.etat = "en_cours"
+            try:
+                tache.nb_lignes = integrer_releve(df_nouveau, engine, mode=tache.mode, journal=tache.journal)
+            finally:
+                _verrou_ecriture.release()
+        etat = "terminee"
+    except Exception as e:
+        tache.erreur = str(e)
+    finally:
+        if engine is not None:
+            tache.execution.enregistrer(engine)
+        tache.terminee_le = dt.datetime.now()
+        # En dernier : la page considère la tâche finie dès qu'elle voit cet état
+        tache.etat = etat
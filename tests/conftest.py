@@ -0,0 +1,54 @@
+import os
+
+import pytest
+from sqlalchemy import create_engine, text
+
+# Relevé synthétique partagé par les tests de lecture / classement / dédoublonnage
+NB_OPERATIONS = 300
+NB_COMPTES = 2
+
+# Schéma jetable pour les tests qui écrivent en base (PostgreSQL seulement)
+SCHEMA_TESTS = "tests_budget"
+
+
+@pytest.fixture
+def engine_pg():
+    """
+    Engine limité au schéma SCHEMA_TESTS, recréé vide et migré pour chaque
+    test. Test ignoré si DATABASE_URL ne désigne pas une base PostgreSQL.
+    """
+    url = os.getenv("DATABASE_URL", "")
+    if not url.startswith("postgresql"):
+        pytest.skip("DATABASE_URL PostgreSQL requise")
+
+    from scripts.schema import appliquer_migrations
+
+    engine = create_engine(url, connect_args={"options": f"-csearch_path={SCHEMA_TESTS}"})
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA_TESTS} CASCADE;"))
+        conn.execute(text(f"CREATE SCHEMA {SCHEMA_TESTS};"))
+        appliquer_migrations(conn)
+    yield engine
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA_TESTS} CASCADE;"))
+    engine.dispose()
+
+
+@pytest.fixture(scope="session")
+def releve_genere(tmp_path_factory) -> str:
+    """Chemin d'un relevé .xlsx de benchmarks.generateur (NB_OPERATIONS sur NB_COMPTES comptes)."""
+    from benchmarks.generateur import generer_releve
+
+    return generer_releve(str(tmp_path_factory.mktemp("releves") / "CA_test.xlsx"), NB_OPERATIONS, NB_COMPTES, graine=1)
+
+
+@pytest.fixture(scope="session")
+def operations_generees(releve_genere):
+    """Opérations du relevé généré, lues par traiter_fichier_bancaire (journal en sourdine)."""
+    import contextlib
+    import io
+
+    from scripts.A_traitement_donnees import traiter_fichier_bancaire
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        return traiter_fichier_bancaire(releve_genere)
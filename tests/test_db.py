@@ -0,0 +1,12 @@
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+from db import copier_dataframe
+
+
+def test_copier_dataframe_temporaire_hors_postgresql_remplace_la_table():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        copier_dataframe(pd.DataFrame({"id": [1, 2]}), "staging", conn, temporaire=True)
+        copier_dataframe(pd.DataFrame({"id": [3]}), "staging", conn, temporaire=True)
+        assert conn.execute(text("SELECT id FROM staging")).scalars().all() == [3]
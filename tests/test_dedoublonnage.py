@@ -0,0 +1,47 @@
+import pandas as pd
+
+from scripts.dedoublonnage import ajouter_empreintes
+
+
+def _operations(libelles, montants=None):
+    return pd.DataFrame({
+        "Compte": 1,
+        "Date": pd.Timestamp("2024-03-01"),
+        "Libellé": libelles,
+        "Montant": montants if montants is not None else [-2.5] * len(libelles),
+    })
+
+
+def test_operations_identiques_numerotees():
+    df = ajouter_empreintes(_operations(["CAFE", "CAFE", "PAIN", "CAFE"]))
+
+    assert df["Occurrence"].tolist() == [0, 1, 0, 2]
+    assert df["Empreinte"].is_unique
+    assert df["Empreinte"].str.fullmatch(r"[0-9a-f]{32}").all()
+
+
+def _empreinte(libelle, montant=-2.5):
+    return ajouter_empreintes(_operations([libelle], [montant]))["Empreinte"].iloc[0]
+
+
+def test_libelle_normalise_dans_l_empreinte():
+    # Casse et espaces ne changent pas l'empreinte ; le montant compte au centime près
+    assert _empreinte("cb  cafe ") == _empreinte("CB CAFE")
+    assert _empreinte("CB CAFE", -2.501) == _empreinte("CB CAFE")
+    assert _empreinte("CB CAFE", -2.51) != _empreinte("CB CAFE")
+    assert _empreinte("CB CAFES") != _empreinte("CB CAFE")
+
+
+def test_releves_qui_se_chevauchent(operations_generees):
+    # Deux relevés couvrant des journées entières, avec un tiers des jours en commun :
+    # une opération commune a la même empreinte dans les deux
+    df = operations_generees
+    dates = sorted(df["Date"].unique())
+    debut_b, fin_a = dates[len(dates) // 3], dates[2 * len(dates) // 3]
+    releve_a = ajouter_empreintes(df[df["Date"] <= fin_a])
+    releve_b = ajouter_empreintes(df[df["Date"] >= debut_b])
+    tout = ajouter_empreintes(df)
+
+    fusion = pd.concat([releve_a, releve_b]).drop_duplicates("Empreinte")
+    assert len(fusion) == len(df)
+    assert set(fusion["Empreinte"]) == set(tout["Empreinte"])
@@ -0,0 +1,47 @@
+import re
+
+import pandas as pd
+
+from scripts.B_depenses import CATEGORIES, EXCLUSIONS_AUTRES, appliquer_regex, classer_depense, classer_libelles
+
+
+def classer_en_boucle(libelle):
+    """Référence : règles essayées une à une avec re.search, la première trouvée gagne."""
+    texte = str(libelle).upper()
+    for mot in EXCLUSIONS_AUTRES:
+        if mot in texte:
+            return "Autres", mot, True
+    for pattern, categorie in CATEGORIES.items():
+        trouve = re.search(pattern, texte)
+        if trouve:
+            return categorie, trouve.group(1), True
+    return "Autres", None, False
+
+
+def test_premiere_regle_gagne():
+    # CARREFOUR (Alimentation) avant CB (Banque), DECATHLON Vêtements avant Loisirs,
+    # UBER EATS Abonnements avant UBER Transports, exclusion avant toute catégorie
+    assert classer_depense("CB CARREFOUR MARKET 12/03") == ("Alimentation", "CARREFOUR", True)
+    assert classer_depense("DECATHLON 04") == ("Vêtements", "DECATHLON", True)
+    assert classer_depense("CB UBER EATS 02/11") == ("Abonnements", "UBER EATS", True)
+    assert classer_depense("CB PHARMACIE DU CENTRE") == ("Autres", "PHARMACIE", True)
+    assert classer_depense("BRALOUTIN") == ("Autres", None, False)
+
+
+def test_regex_compilee_identique_aux_boucles(operations_generees):
+    libelles = operations_generees["Libellé"]
+    resultats = classer_libelles(libelles)
+
+    attendus = pd.DataFrame(
+        [classer_en_boucle(libelle) for libelle in libelles],
+        columns=["Categorie", "Mot_trouve", "Traitee"], index=libelles.index,
+    )
+    pd.testing.assert_frame_equal(resultats, attendus, check_dtype=False)
+
+
+def test_appliquer_regex_sans_debit_reste_a_traiter():
+    df = pd.DataFrame({"Libellé": ["CB LIDL 01/02", "CB LIDL 02/02"], "Débit euros": [12.5, None]})
+    resultat = appliquer_regex(df)
+
+    assert resultat["Categorie"].tolist() == ["Alimentation", "Autres"]
+    assert resultat["Traitee"].tolist() == [True, False]
@@ -0,0 +1,18 @@
+import pandas as pd
+
+from scripts.index_ngrammes import IndexNgrammes
+
+
+def test_petite_reference_garde_les_ngrammes_communs():
+    # Sur quatre libellés, "CB ", "CAR", "/03"... sont dans plus de 10 % d'entre
+    # eux : élagués, la correspondance tombait sous le seuil (alors que le fuzzy la trouve)
+    df_traitees = pd.DataFrame({
+        "Libellé": ["CB CARREFOUR MARKET 12/03", "CB CARREFOUR CITY 14/03", "CB LECLERC DRIVE 15/03", "PRLV SEPA FREE MOBILE"],
+        "Categorie": ["Alimentation", "Alimentation", "Alimentation", "Abonnements"],
+    })
+    index = IndexNgrammes.construire(df_traitees)
+
+    resultat = index.rechercher(["CB CARREFOUR MARKET 19/03"], seuil=90)
+
+    assert resultat["Libelle_traite_similaire"].tolist() == ["CB CARREFOUR MARKET 12/03"]
+    assert resultat["Categorie"].tolist() == ["Alimentation"]
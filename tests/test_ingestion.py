@@ -0,0 +1,26 @@
+import pandas as pd
+from sqlalchemy import text
+
+from scripts.ingestion import recalculer_soldes_courants
+
+
+def _inserer(conn, lignes):
+    for compte, date, montant, solde_courant in lignes:
+        conn.execute(text("""
+            INSERT INTO operations ("Compte", "Date", "Libellé", "Montant", "Solde final",
+                                    "Date solde final", "Solde courant", "Empreinte")
+            VALUES (:compte, :date, 'OPERATION', :montant, 100, '2024-01-31', :solde, gen_random_uuid()::text)
+        """), {"compte": compte, "date": date, "montant": montant, "solde": solde_courant})
+
+
+def test_recalculer_soldes_courants_n_ecrit_que_les_lignes_modifiees(engine_pg):
+    with engine_pg.begin() as conn:
+        # Soldes attendus : 95.50, 85.50, 105.50 ; le deuxième est faux
+        _inserer(conn, [(1, "2024-01-01", -10, 95.5), (1, "2024-01-02", 20, 0), (1, "2024-01-03", -5.5, 105.5)])
+
+    with engine_pg.begin() as conn:
+        assert recalculer_soldes_courants(conn) == 1
+    with engine_pg.begin() as conn:
+        assert recalculer_soldes_courants(conn) == 0
+        soldes = pd.read_sql(text('SELECT "Solde courant" FROM operations ORDER BY id'), conn)
+    assert soldes["Solde courant"].astype(float).tolist() == [95.5, 85.5, 105.5]
@@ -0,0 +1,24 @@
+import os
+
+import pytest
+
+from scripts import snapshot
+
+
+def test_ecrire_snapshot_sans_fichier_temporaire_restant(engine_pg, tmp_path):
+    chemin = str(tmp_path / "operations.parquet")
+    assert snapshot.ecrire_snapshot(engine_pg, chemin) == 0
+    assert snapshot.version_snapshot(chemin) == 0
+    assert os.listdir(tmp_path) == ["operations.parquet"]
+
+
+def test_ecrire_snapshot_supprime_le_fichier_temporaire_en_cas_d_erreur(engine_pg, tmp_path, monkeypatch):
+    import pyarrow.parquet as pq
+
+    def echec(*args, **kwargs):
+        raise OSError("disque plein")
+
+    monkeypatch.setattr(pq, "write_table", echec)
+    with pytest.raises(OSError):
+        snapshot.ecrire_snapshot(engine_pg, str(tmp_path / "operations.parquet"))
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,23 @@
+import pandas as pd
+
+from scripts.A_traitement_donnees import calculer_solde_courant
+
+
+def _releve(montants, compte=1):
+    return pd.DataFrame({
+        "Compte": compte,
+        "Date": pd.date_range("2024-01-01", periods=len(montants)),
+        "Montant": montants,
+        "Solde final": 100.0,
+        "Date solde final": pd.Timestamp("2024-01-31"),
+    })
+
+
+def test_solde_courant_par_compte():
+    df = pd.concat([_releve([-10.0, 20.0, -5.5]), _releve([-1.0], compte=2)], ignore_index=True)
+    assert calculer_solde_courant(df).tolist() == [95.5, 85.5, 105.5, 101.0]
+
+
+def test_montant_manquant_compte_pour_zero():
+    df = _releve([-10.0, None, -5.5])
+    assert calculer_solde_courant(df).tolist() == [115.5, 105.5, 105.5]
@@ -0,0 +1,65 @@
+import pandas as pd
+
+from scripts.A_traitement_donnees import detecter_soldes, extraire_section, lire_grille
+from tests.conftest import NB_COMPTES, NB_OPERATIONS
+
+COLONNES_SECTION = ["Date", "Date valeur", "Libellé", "Débit euros", "Crédit euros"]
+
+
+def test_lire_grille(releve_genere):
+    raw = lire_grille(releve_genere)
+
+    assert raw.iloc[0, 0] == "CREDIT AGRICOLE"
+    # Une ligne par opération, plus en-têtes et séparateurs ; pas de ligne vide finale
+    assert len(raw) > NB_OPERATIONS
+    assert raw.iloc[-1].notna().any()
+
+
+def test_lire_grille_depuis_un_objet_fichier(releve_genere):
+    with open(releve_genere, "rb") as f:
+        assert lire_grille(f).equals(lire_grille(releve_genere))
+
+
+def test_detecter_soldes(releve_genere):
+    raw = lire_grille(releve_genere)
+    soldes = detecter_soldes(raw)
+
+    assert len(soldes) == NB_COMPTES
+    assert soldes["ligne_solde"].is_monotonic_increasing
+    assert (soldes["date_solde"] == pd.Timestamp("2025-11-14")).all()
+    for ligne, solde in zip(soldes["ligne_solde"], soldes["solde"]):
+        assert raw.iloc[ligne, 0].startswith("Solde au ")
+        assert 100 <= solde <= 15000
+
+
+def test_detecter_soldes_montant_avec_milliers():
+    raw = pd.DataFrame([["CREDIT AGRICOLE", None], ["Solde au 31/01/2024", "12 345,67"]], dtype=object)
+    soldes = detecter_soldes(raw)
+
+    assert soldes[["ligne_solde", "solde"]].values.tolist() == [[1, 12345.67]]
+    assert soldes["date_solde"].tolist() == [pd.Timestamp("2024-01-31")]
+
+
+def test_extraire_section(releve_genere):
+    raw = lire_grille(releve_genere)
+    entetes = raw.index[raw.eq("Date").any(axis=1)].tolist()
+    assert len(entetes) == NB_COMPTES
+
+    section = extraire_section(raw, entetes[0], entetes[1])
+
+    assert section.columns.tolist() == COLONNES_SECTION
+    # Opérations de la première section, puis les lignes de la section suivante (vide, compte, solde)
+    dates = pd.to_datetime(section["Date"], errors="coerce")
+    assert dates.notna().sum() == NB_OPERATIONS // NB_COMPTES
+
+
+def test_extraire_section_noms_de_colonnes_comme_read_excel():
+    raw = pd.DataFrame([["Date", None, "Date"], ["2024-01-01", 1, "2024-01-02"]], dtype=object)
+
+    assert extraire_section(raw, 0, 2).columns.tolist() == ["Date", "Unnamed: 1", "Date.1"]
+
+
+def test_traiter_fichier_bancaire(operations_generees):
+    assert len(operations_generees) == NB_OPERATIONS
+    assert operations_generees["Compte"].nunique() == NB_COMPTES
+    assert (operations_generees["Montant"] == operations_generees["Crédit euros"] - operations_generees["Débit euros"]).all()